@@ -1,27 +1,158 @@
 # admin.py
-from flask import Blueprint, render_template
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required, current_user
 import models
+import billing
+import cohorts
+import db_pool
+import reconcile
+import revenue
+import rollups
+import tracing
+import writebehind
 
 admin_bp = Blueprint("admin", __name__)
 
+def requested_month():
+    """?month=YYYY-MM as a date, this month when absent; None when malformed"""
+    value = request.args.get("month")
+    if not value:
+        return date.today()
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        return None
+
 @admin_bp.route("/admin")
 @login_required
 def admin_dashboard():
     if current_user.role != "admin":
         return render_template("unauthorized.html"), 403
 
-    user_count = len(models.get_all_users())
-    member_count = len(models.get_all_members())
-    trainer_count = len(models.get_all_trainers())
-    equipment_count = len(models.get_all_equipment())
-    payment_count = len(models.get_all_payments())
+    stats = models.get_admin_stats()
+    return render_template("admin_dashboard.html", **stats)
+
+@admin_bp.route("/admin/db-pool")
+@login_required
+def db_pool_stats():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    return jsonify(db_pool.get_pool().stats())
+
+@admin_bp.route("/admin/write-behind")
+@login_required
+def write_behind_stats():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    return jsonify(writebehind.stats())
+
+@admin_bp.route("/admin/reconcile")
+@login_required
+def reconcile_stats():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    stats = reconcile.stats()
+    stats["recent_changes"] = [
+        {**c, "ChangedAt": c["ChangedAt"].isoformat(sep=" ")}
+        for c in models.get_membership_changes(limit=50)
+    ]
+    return jsonify(stats)
+
+@admin_bp.route("/admin/billing")
+@login_required
+def billing_runs():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    runs = [
+        {
+            **r,
+            "BillingMonth": r["BillingMonth"].strftime("%Y-%m"),
+            "StartedAt": r["StartedAt"].isoformat(sep=" "),
+            "FinishedAt": r["FinishedAt"].isoformat(sep=" ") if r["FinishedAt"] else None
+        }
+        for r in models.get_billing_runs()
+    ]
+    return jsonify(runs)
+
+@admin_bp.route("/admin/billing/run", methods=["POST"])
+@login_required
+def run_billing():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    month = requested_month()
+    if month is None:
+        return jsonify({"error": "month must be YYYY-MM"}), 400
+    report = billing.run(month)
+    if report is None:
+        return jsonify({"error": "Billing for that month is already running"}), 409
+    return jsonify(report.as_dict())
 
+@admin_bp.route("/admin/cache")
+@login_required
+def cache_stats():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    return jsonify(models.cache_stats())
+
+@admin_bp.route("/admin/perf")
+@login_required
+def perf():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    return render_template("perf.html", endpoints=tracing.endpoint_report())
+
+@admin_bp.route("/admin/reports/attendance")
+@login_required
+def attendance_report():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    month = requested_month()
+    if month is None:
+        return jsonify({"error": "month must be YYYY-MM"}), 400
+    first, last = rollups.month_bounds(month)
     return render_template(
-        "admin_dashboard.html",
-        user_count=user_count,
-        member_count=member_count,
-        trainer_count=trainer_count,
-        equipment_count=equipment_count,
-        payment_count=payment_count
+        "attendance_report.html",
+        month=first,
+        prev_month=(first - timedelta(days=1)).strftime("%Y-%m"),
+        next_month=(last + timedelta(days=1)).strftime("%Y-%m"),
+        classes=models.get_class_popularity(first, last),
+        rooms=models.get_room_utilisation(first, last),
+        members=models.get_member_visits(first)
     )
+
+@admin_bp.route("/admin/reports/revenue")
+@login_required
+def revenue_report():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    month = requested_month()
+    if month is None:
+        return jsonify({"error": "month must be YYYY-MM"}), 400
+    first, last = rollups.month_bounds(month)
+    return render_template(
+        "revenue_report.html",
+        report=revenue.month_report(first),
+        series=revenue.monthly_series(),
+        prev_month=(first - timedelta(days=1)).strftime("%Y-%m"),
+        next_month=(last + timedelta(days=1)).strftime("%Y-%m")
+    )
+
+@admin_bp.route("/admin/reports/cohorts")
+@login_required
+def cohort_report():
+    if current_user.role != "admin":
+        return render_template("unauthorized.html"), 403
+
+    months = request.args.get("months", 12, type=int)
+    return render_template("cohort_report.html", report=cohorts.report(cohort_count=max(1, min(months, 36))))
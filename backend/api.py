@@ -1,19 +1,116 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required
 from members import roles_required
 import models
+import mysql.connector
+import checkin
+from etags import conditional
 
 api = Blueprint("api", __name__, url_prefix="/api")
 
-def make_endpoint(name, get_all, create_fn, fields, required):
+def wants_ndjson():
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+def stream_json(rows, ndjson=False):
+    """Encode rows one at a time as a JSON array, or one object per line"""
+    dumps = current_app.json.dumps
+    if ndjson:
+        for row in rows:
+            yield dumps(row) + "\n"
+        return
+
+    yield "["
+    first = True
+    for row in rows:
+        yield (dumps(row) if first else "," + dumps(row))
+        first = False
+    yield "]"
+
+def bulk_create(table, columns, unique, fields, required, items):
+    """Validate every item, then insert (or upsert) them all in one transaction"""
+    upsert = request.args.get("upsert") in ("1", "true")
+    if upsert and not unique:
+        return jsonify({"error": "upsert is not supported for this endpoint"}), 400
+
+    results = []
+    rows = []
+    for i, data in enumerate(items):
+        if not isinstance(data, dict):
+            results.append({"index": i, "status": "error", "error": "item must be an object"})
+            continue
+        missing = [f for f in required if not data.get(f)]
+        if missing:
+            results.append({"index": i, "status": "error", "error": f"{missing[0]} is required"})
+            continue
+        results.append({"index": i, "status": None})
+        # An upsert must not blank out fields the item doesn't mention
+        rows.append(tuple(
+            data[f] if f in data else (models.OMITTED if upsert else None) for f in fields
+        ))
+
+    # Plain inserts must not collide with existing rows or with each other
+    if unique and not upsert:
+        key_field = fields[columns.index(unique)]
+        keys = [str(d.get(key_field)).lower() for d in items if isinstance(d, dict) and d.get(key_field)]
+        taken = models.existing_values(table, unique, keys)
+        repeated = set()
+        for r in results:
+            if r["status"] is not None:
+                continue
+            key = str(items[r["index"]][key_field]).lower()
+            if key in taken or key in repeated:
+                r["status"] = "error"
+                r["error"] = f"{key_field} already exists"
+            repeated.add(key)
+
+    if any(r["status"] == "error" for r in results):
+        for r in results:
+            r["status"] = r["status"] or "valid"
+        return jsonify({"error": "validation failed, nothing was written", "results": results}), 400
+
+    try:
+        statuses = models.bulk_insert(table, columns, rows, unique=unique if upsert else None)
+    except mysql.connector.Error as e:
+        return jsonify({"error": f"Database error: {e}"}), 400
+
+    for r, status in zip(results, statuses):
+        r["status"] = status
+    return jsonify({
+        "created": statuses.count("created"),
+        "updated": statuses.count("updated"),
+        "results": results
+    }), 201
+
+def make_endpoint(name, query, pk, create_fn, fields, required, table, columns, unique=None, reads=()):
     @api.route(f"/{name}", methods=["GET","POST"])
     @login_required
     @roles_required("admin","manager")
+    @conditional(table, *reads)
     def generic():
         if request.method == "GET":
-            return jsonify(get_all())
+            # Optional keyset params: ?limit=N&after=<last primary key seen>
+            for param in ("limit", "after"):
+                value = request.args.get(param)
+                if value is not None and not value.lstrip("-").isdigit():
+                    return jsonify({"error": f"{param} must be an integer"}), 400
+            limit = request.args.get("limit", type=int)
+            after = request.args.get("after", type=int)
+            if limit is not None and limit <= 0:
+                return jsonify({"error": "limit must be positive"}), 400
+
+            ndjson = wants_ndjson()
+            rows = models.stream_rows(query, pk, after=after, limit=limit)
+            return Response(
+                stream_with_context(stream_json(rows, ndjson)),
+                mimetype="application/x-ndjson" if ndjson else "application/json"
+            )
 
         data = request.get_json() or {}
+        if isinstance(data, list):
+            return bulk_create(table, columns, unique, fields, required, data)
+
         # 1) Validate required fields
         for f in required:
             if not data.get(f):
@@ -32,57 +129,109 @@ def make_endpoint(name, get_all, create_fn, fields, required):
 # MEMBERS
 make_endpoint(
     name="members",
-    get_all=models.get_all_members,
+    query=models.MEMBER_LIST_SQL,
+    pk="m.MemberID",
     create_fn=models.create_member,
     fields=[
       "firstName","lastName","email",
       "dateOfBirth","phoneNumber",
       "currentPlanID","membershipStatus","membershipStartDate"
     ],
-    required=["firstName","lastName","email"]
+    required=["firstName","lastName","email"],
+    table="Member",
+    columns=[
+      "FirstName","LastName","Email",
+      "DateOfBirth","PhoneNumber",
+      "CurrentPlanID","MembershipStatus","MembershipStartDate"
+    ],
+    unique="Email",
+    reads=("MembershipPlan",)
 )
 
 # PLANS
 make_endpoint(
     name="plans",
-    get_all=models.get_all_plans,
+    query="SELECT * FROM MembershipPlan",
+    pk="PlanID",
     create_fn=models.create_plan,
     fields=["planName","monthlyFee","accessLevel"],
-    required=["planName","monthlyFee"]
+    required=["planName","monthlyFee"],
+    table="MembershipPlan",
+    columns=["PlanName","MonthlyFee","AccessLevel"]
 )
 
 # TRAINERS
 make_endpoint(
     name="trainers",
-    get_all=models.get_all_trainers,
+    query="SELECT * FROM Trainer",
+    pk="TrainerID",
     create_fn=models.create_trainer,
     fields=["firstName","lastName","email","specialty"],
-    required=["firstName","lastName","email"]
+    required=["firstName","lastName","email"],
+    table="Trainer",
+    columns=["FirstName","LastName","Email","Specialty"],
+    unique="Email"
 )
 
 # ROOMS
 make_endpoint(
     name="rooms",
-    get_all=models.get_all_rooms,
+    query="SELECT * FROM Room",
+    pk="RoomID",
     create_fn=models.create_room,
     fields=["roomName","capacity"],
-    required=["roomName","capacity"]
+    required=["roomName","capacity"],
+    table="Room",
+    columns=["RoomName","Capacity"]
 )
 
 # EQUIPMENT
 make_endpoint(
     name="equipment",
-    get_all=models.get_all_equipment,
+    query="SELECT * FROM Equipment",
+    pk="EquipmentID",
     create_fn=models.create_equipment,
     fields=["equipmentName","purchaseDate","condition","roomID"],
-    required=["equipmentName","roomID"]
+    required=["equipmentName","roomID"],
+    table="Equipment",
+    columns=["EquipmentName","PurchaseDate","Condition","RoomID"]
 )
 
 # STAFF
 make_endpoint(
     name="staff",
-    get_all=models.get_all_staff,
+    query="SELECT * FROM Staff",
+    pk="StaffID",
     create_fn=models.create_staff,
     fields=["firstName","lastName","email","role"],
-    required=["firstName","lastName","email","role"]
-)
\ No newline at end of file
+    required=["firstName","lastName","email","role"],
+    table="Staff",
+    columns=["FirstName","LastName","Email","Role"],
+    unique="Email"
+)
+# CHECK-IN
+@api.route("/checkin", methods=["POST"])
+@login_required
+@roles_required("admin","manager","trainer")
+def checkin_endpoint():
+    """Door kiosk check-in: {"memberId"|"email"|"phone": ..., "roomId": optional}"""
+    data = request.get_json(silent=True) or {}
+    if not any(data.get(k) for k in ("memberId", "email", "phone")):
+        return jsonify({"error": "memberId, email or phone is required"}), 400
+
+    try:
+        result = checkin.check_in(
+            member_id=data.get("memberId"),
+            email=data.get("email"),
+            phone=data.get("phone"),
+            room_id=data.get("roomId")
+        )
+    except checkin.CheckInError as e:
+        return jsonify({"error": str(e)}), e.status
+    except (TypeError, ValueError):
+        return jsonify({"error": "memberId and roomId must be numbers"}), 400
+    except mysql.connector.IntegrityError:
+        # A room or session removed since it was cached; read them afresh next time
+        models.invalidate_table("ClassSchedule")
+        return jsonify({"error": "Unknown room or class session"}), 400
+    return jsonify(result), 201
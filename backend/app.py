@@ -1,11 +1,10 @@
 import os
 from dotenv import load_dotenv
 load_dotenv()
-from models import get_user_by_id, User
+from models import load_session_user, User
 
 from flask import Flask, render_template, redirect, url_for, send_from_directory
 from flask_login import LoginManager, login_required, current_user
-from werkzeug.security import generate_password_hash
 
 import models
 import auth
@@ -22,6 +21,11 @@ import class_calendar
 import admin
 import classes
 import staff
+import passwords
+import migrations
+import tracing
+import writebehind
+import reconcile
 
 # ── Flask App Setup ──
 app = Flask(__name__)
@@ -33,9 +37,19 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "auth.login"
 
+# ── Database Connection Teardown ──
+app.teardown_appcontext(models.close_db)
+
+# ── Per-Request SQL Tracing ──
+tracing.init_app(app)
+
+# ── Optional Write-Behind Queue for Check-ins ──
+writebehind.init_app(app)
+reconcile.init_app(app)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return get_user_by_id(user_id)
+    return load_session_user(user_id)
 
 # ── Ensure Database and Admin ──
 def ensure_database_and_admin():
@@ -43,12 +57,14 @@ def ensure_database_and_admin():
         if not db_init.check_database_exists():
             print("Database not found. Initializing database...")
             db_init.initialize_database()
+        else:
+            migrations.migrate()
 
         admin_user = os.getenv("ADMIN_USER", "admin")
         admin_pass = os.getenv("ADMIN_PASS", "admin")
 
         if not models.get_user_by_username(admin_user):
-            pw_hash = generate_password_hash(admin_pass, method="pbkdf2:sha256")
+            pw_hash = passwords.hash_password(admin_pass)
             db = models.get_db()
             cur = db.cursor()
             cur.execute(
@@ -89,5 +105,6 @@ def dashboard():
 
 # ── Entry Point ──
 if __name__ == "__main__":
-    ensure_database_and_admin()
+    with app.app_context():
+        ensure_database_and_admin()
     app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
-from models import get_user_by_username, get_user_by_id, get_db, User
+from models import get_user_by_username, update_user_password, User
+from passwords import verify_password, needs_rehash, VerifierBusy
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -13,7 +13,16 @@ def login():
 
         user_obj = get_user_by_username(username)
 
-        if user_obj and check_password_hash(user_obj.PasswordHash, password):
+        try:
+            valid = user_obj is not None and verify_password(user_obj.PasswordHash, password)
+        except VerifierBusy:
+            flash("Too many sign-ins in progress, please try again in a moment.", "error")
+            return render_template("login.html"), 503
+
+        if valid:
+            # Upgrade hashes made under an older method/cost while we have the plaintext
+            if needs_rehash(user_obj.PasswordHash):
+                update_user_password(user_obj.id, password)
             login_user(user_obj)
             return redirect(url_for("dashboard"))
         else:
@@ -39,16 +48,18 @@ def change_password():
 
         user = current_user  # already a User object
 
-        if not check_password_hash(user.PasswordHash, current_password):
+        try:
+            valid = verify_password(user.PasswordHash, current_password)
+        except VerifierBusy:
+            flash("Server is busy, please try again in a moment.", "error")
+            return render_template("change_password.html"), 503
+
+        if not valid:
             flash("Incorrect current password", "error")
         elif new_password != confirm_password:
             flash("New passwords do not match", "error")
         else:
-            hashed = generate_password_hash(new_password, method="pbkdf2:sha256")
-            db = get_db()
-            cur = db.cursor()
-            cur.execute("UPDATE User SET PasswordHash = %s WHERE UserID = %s", (hashed, user.id))
-            db.commit()
+            update_user_password(user.id, new_password)
             flash("Password updated successfully.", "success")
             return redirect(url_for("dashboard"))
 
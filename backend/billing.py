@@ -0,0 +1,68 @@
+import logging
+import os
+import time
+from datetime import date
+
+import models
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("BILLING_BATCH", "2000"))
+LOCK_NAME = "gymdb_billing_{month}"
+
+
+class BillingReport:
+    def __init__(self, month):
+        self.month = month
+        self.resumed_after = 0
+        self.batches = 0
+        self.created = 0
+        self.elapsed_ms = 0.0
+
+    def as_dict(self):
+        return {
+            "month": self.month.strftime("%Y-%m"),
+            "resumed_after": self.resumed_after,
+            "batches": self.batches,
+            "created": self.created,
+            "elapsed_ms": self.elapsed_ms
+        }
+
+
+def run(month=None, batch_size=BATCH_SIZE):
+    """Invoice every active member for `month` at their plan's MonthlyFee.
+
+    Each batch inserts its invoices and advances the run's checkpoint in
+    the same transaction, so a run that dies part way resumes after the
+    last committed batch. Rerunning a finished month only adds invoices
+    for members who were not billed yet. Returns None if another process
+    is billing the same month.
+    """
+    month = (month or date.today()).replace(day=1)
+    db = models.get_db()
+    cur = db.cursor()
+    lock = LOCK_NAME.format(month=month.strftime("%Y%m"))
+    cur.execute("SELECT GET_LOCK(%s, 0)", (lock,))
+    if cur.fetchone()[0] != 1:
+        logger.info(f"Billing for {month:%Y-%m} is already running elsewhere; skipped")
+        return None
+
+    report = BillingReport(month)
+    started = time.perf_counter()
+    try:
+        after = report.resumed_after = models.start_billing_run(month)
+        while after is not None:
+            after, created = models.bill_members(month, after, batch_size, month)
+            report.batches += 1
+            report.created += created
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (lock,))
+        cur.fetchone()
+        if report.created:
+            models.invalidate_table("Payments")
+
+    report.elapsed_ms = round(1000 * (time.perf_counter() - started), 2)
+    logger.info(f"Billing {month:%Y-%m}: {report.created} invoices in {report.batches} batches "
+                f"({report.elapsed_ms} ms)")
+    return report
+
@@ -0,0 +1,71 @@
+import os
+from datetime import datetime, timedelta
+
+import models
+import writebehind
+
+# How long before a session starts a check-in already counts towards it
+EARLY_MINUTES = int(os.getenv("CHECKIN_EARLY_MINUTES", "15"))
+
+
+class CheckInError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def member_summary(member):
+    return {
+        "memberId": member["MemberID"],
+        "name": f"{member['FirstName']} {member['LastName']}",
+        "membershipStatus": member["MembershipStatus"]
+    }
+
+
+def running_session(room_id, now):
+    offset = now - datetime.combine(now.date(), datetime.min.time())
+    early = timedelta(minutes=EARLY_MINUTES)
+    for session in models.get_room_sessions(room_id, now.date()):
+        if session["StartTime"] - early <= offset < session["EndTime"]:
+            return session
+    return None
+
+
+def check_in(member_id=None, email=None, phone=None, room_id=None, now=None):
+    """Resolve the member, validate their membership and record the visit.
+
+    Raises CheckInError with an HTTP status when the member is unknown or
+    may not enter. Returns the member summary and the session they joined.
+    """
+    member = models.member_index.lookup(member_id=member_id, email=email, phone=phone)
+    if member is None:
+        raise CheckInError("Member not found", 404)
+
+    status = (member["MembershipStatus"] or "").lower()
+    if status != "active":
+        raise CheckInError(f"Membership is {status or 'not active'}", 403)
+    if member["CurrentPlanID"] is None:
+        raise CheckInError("Member has no current plan", 403)
+    plans = {p["PlanID"] for p in models.get_all_plans()}
+    if member["CurrentPlanID"] not in plans:
+        raise CheckInError("Member's plan no longer exists", 403)
+
+    session = None
+    if room_id is not None:
+        session = running_session(int(room_id), now or datetime.now())
+
+    schedule_id = session["ScheduleID"] if session else None
+    if not writebehind.record_checkin(member["MemberID"], room_id, schedule_id):
+        # The index was behind the database; pick up the current row
+        models.member_index.refresh(member["MemberID"])
+        raise CheckInError("Membership is not active", 403)
+
+    return {
+        "member": member_summary(member),
+        "session": {
+            "scheduleId": session["ScheduleID"],
+            "className": session["ClassName"],
+            "startTime": str(session["StartTime"]),
+            "endTime": str(session["EndTime"])
+        } if session else None
+    }
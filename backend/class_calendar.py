@@ -1,15 +1,103 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import hashlib
+from datetime import date, datetime, time, timedelta
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from models import (
-    get_all_events, get_event_by_id, create_calendar_event, delete_event,
-    get_all_users, get_all_classes
+    get_event_by_id, create_calendar_event, delete_event,
+    get_all_users, get_all_classes, get_events_in_range,
+    get_schedule_events_in_range
 )
 
 calendar_bp = Blueprint("calendar", __name__, template_folder="templates")
 
+MAX_FEED_DAYS = 62
+
+
+def parse_bound(value):
+    """Accept a date or ISO datetime as sent by calendar widgets; drops any UTC offset"""
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    return parsed.replace(tzinfo=None)
+
+
+def month_window(month):
+    try:
+        first = datetime.strptime(month, "%Y-%m").date() if month else date.today().replace(day=1)
+    except ValueError:
+        first = date.today().replace(day=1)
+    first = first.replace(day=1)
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first, following
+
+
+def session_times(session):
+    # TIME columns arrive as timedeltas from midnight
+    midnight = datetime.combine(session["ScheduleDate"], time.min)
+    return midnight + session["StartTime"], midnight + session["EndTime"]
+
+
+def feed_items(start, end):
+    items = []
+    for e in get_events_in_range(start, end):
+        items.append({
+            "id": f"event-{e['EventID']}",
+            "title": e["Title"],
+            "start": e["StartTime"].isoformat(),
+            "end": e["EndTime"].isoformat(),
+            "type": e["EventType"],
+            "location": e["Location"],
+            "description": e["Description"]
+        })
+    for s in get_schedule_events_in_range(start, end):
+        session_start, session_end = session_times(s)
+        items.append({
+            "id": f"session-{s['ScheduleID']}",
+            "title": s["ClassName"],
+            "start": session_start.isoformat(),
+            "end": session_end.isoformat(),
+            "type": "class",
+            "location": s["RoomName"],
+            "trainer": s["TrainerName"],
+            "scheduleId": s["ScheduleID"],
+            "classId": s["ClassID"]
+        })
+    items.sort(key=lambda item: item["start"])
+    return items
+
+
 @calendar_bp.route("/calendar")
 def calendar_view():
-    events = get_all_events()
-    return render_template("calendar.html", events=events)
+    first, following = month_window(request.args.get("month"))
+    events = get_events_in_range(datetime.combine(first, time.min), datetime.combine(following, time.min))
+    previous = (first - timedelta(days=1)).replace(day=1)
+    return render_template(
+        "calendar.html",
+        events=events,
+        month=first,
+        prev_month=previous.strftime("%Y-%m"),
+        next_month=following.strftime("%Y-%m")
+    )
+
+@calendar_bp.route("/calendar/feed")
+def calendar_feed():
+    """Events and class sessions overlapping start/end, answered with 304 when unchanged"""
+    try:
+        start = parse_bound(request.args["start"])
+        end = parse_bound(request.args["end"])
+    except KeyError:
+        return jsonify({"error": "start and end are required"}), 400
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO dates"}), 400
+    if end <= start:
+        return jsonify({"error": "end must be after start"}), 400
+    if end - start > timedelta(days=MAX_FEED_DAYS):
+        return jsonify({"error": f"window may span at most {MAX_FEED_DAYS} days"}), 400
+
+    body = current_app.json.dumps(feed_items(start, end))
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @calendar_bp.route("/calendar/add", methods=["GET", "POST"])
 def add_event():
@@ -38,4 +126,4 @@ def add_event():
 def delete_event_route(event_id):
     delete_event(event_id)
     flash("Event deleted.", "success")
-    return redirect(url_for("calendar.calendar_view"))
\ No newline at end of file
+    return redirect(url_for("calendar.calendar_view"))
@@ -1,16 +1,79 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
+from datetime import date, timedelta
 import models
+import recurrence
+import scheduling
 
 classes_bp = Blueprint("classes", __name__, url_prefix="/classes")
 
+MAX_WINDOW_DAYS = 93
+
+def check_schedule(session):
+    """Flash any clashes for a proposed session; True when it may be saved"""
+    if session.end <= session.start:
+        flash("End time must be after start time.", "danger")
+        return False
+
+    conflicts = scheduling.check_session(session)
+    for conflict in conflicts:
+        flash(conflict.message(), "danger" if conflict.blocking else "warning")
+    return not any(c.blocking for c in conflicts)
+
+def flash_booking(booking):
+    if booking.result == "duplicate":
+        flash("That member is already booked into this session.", "danger")
+    elif booking.result == "missing":
+        flash("That booking or session no longer exists.", "danger")
+    elif booking.result == "waitlisted":
+        where = f" at position {booking.position}" if booking.position else ""
+        flash(f"The session is full; the member was added to the waitlist{where}.", "warning")
+    else:
+        flash("Booking saved.", "success")
+
+def resolve_window(args):
+    """Turn ?window=today|week|custom&start=&end= into an inclusive date range"""
+    window = args.get("window", "today")
+    today = date.today()
+
+    if window == "week":
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=6)
+    elif window == "custom":
+        try:
+            start = date.fromisoformat(args.get("start", ""))
+            end = date.fromisoformat(args.get("end", ""))
+        except ValueError:
+            flash("Enter both dates as YYYY-MM-DD.", "danger")
+            start = end = today
+            window = "today"
+        if end < start:
+            start, end = end, start
+        if (end - start).days >= MAX_WINDOW_DAYS:
+            end = start + timedelta(days=MAX_WINDOW_DAYS - 1)
+            flash(f"Showing the first {MAX_WINDOW_DAYS} days of that range.", "info")
+    else:
+        window = "today"
+        start = end = today
+
+    return window, start, end
+
 @classes_bp.route("/")
 @login_required
 def list_classes():
+    window, start, end = resolve_window(request.args)
+    span = (end - start).days + 1
+
     classes = models.get_all_classes()
-    schedules = models.get_all_class_schedules()
-    attendance = models.get_all_attendance()
-    return render_template("classes.html", classes=classes, schedules=schedules, attendance=attendance)
+    sessions = models.get_sessions_in_range(start, end)
+    attendance = models.get_attendance_in_range(start, end)
+    return render_template(
+        "classes.html",
+        classes=classes, sessions=sessions, attendance=attendance,
+        window=window, start=start, end=end,
+        prev_start=start - timedelta(days=span), prev_end=start - timedelta(days=1),
+        next_start=end + timedelta(days=1), next_end=end + timedelta(days=span)
+    )
 
 @classes_bp.route("/add", methods=["GET", "POST"])
 @login_required
@@ -72,7 +135,14 @@ def add_schedule():
         start = request.form["StartTime"]
         end = request.form["EndTime"]
 
-        # Optional: validate inputs here
+        try:
+            session = scheduling.Session(class_id, date, start, end)
+        except ValueError:
+            flash("Enter a valid date and times.", "danger")
+            return render_template("add_schedule.html", classes=classes, form=request.form)
+        if not check_schedule(session):
+            return render_template("add_schedule.html", classes=classes, form=request.form)
+
         try:
             models.create_class_schedule(class_id, date, start, end)
             flash("Class schedule added successfully!", "success")
@@ -98,6 +168,16 @@ def edit_schedule(sid):
         date = request.form["schedule_date"]
         start = request.form["start_time"]
         end = request.form["end_time"]
+
+        try:
+            session = scheduling.Session(class_id, date, start, end, schedule_id=sid)
+        except ValueError:
+            flash("Enter a valid date and times.", "danger")
+            return render_template("edit_schedule.html", sched=sched, classes=classes)
+        if not check_schedule(session):
+            sched = dict(sched, ClassID=int(class_id), ScheduleDate=date, StartTime=start, EndTime=end)
+            return render_template("edit_schedule.html", sched=sched, classes=classes)
+
         models.update_class_schedule(sid, class_id, date, start, end)
         return redirect(url_for("classes.list_classes"))
 
@@ -109,6 +189,82 @@ def delete_schedule(sid):
     models.delete_schedule(sid)
     return redirect(url_for("classes.list_classes"))
 
+@classes_bp.route("/recurrences")
+@login_required
+def list_recurrences():
+    return render_template(
+        "recurrences.html",
+        rules=models.get_all_recurrences(),
+        exceptions=models.get_upcoming_exceptions(),
+        classes=models.get_all_classes(),
+        weekdays=recurrence.WEEKDAYS,
+        horizon=recurrence.HORIZON_DAYS
+    )
+
+def flash_extend(report):
+    flash(f"{report.created} session(s) generated.", "success")
+    for session, messages in report.skipped[:5]:
+        flash(f"Skipped {session.describe()}: {messages[0]}", "warning")
+    if len(report.skipped) > 5:
+        flash(f"{len(report.skipped) - 5} more session(s) skipped because of conflicts.", "warning")
+
+@classes_bp.route("/recurrences/add", methods=["POST"])
+@login_required
+def add_recurrence():
+    try:
+        weekdays = recurrence.parse_weekdays(request.form.getlist("Weekdays"))
+        session = scheduling.Session(
+            request.form["ClassID"], request.form["StartDate"],
+            request.form["StartTime"], request.form["EndTime"]
+        )
+        end_date = date.fromisoformat(request.form["EndDate"]) if request.form.get("EndDate") else None
+    except ValueError as e:
+        flash(f"Error: {str(e)}", "danger")
+        return redirect(url_for("classes.list_recurrences"))
+    if session.end <= session.start:
+        flash("End time must be after start time.", "danger")
+        return redirect(url_for("classes.list_recurrences"))
+
+    rid = models.create_recurrence(
+        session.class_id, weekdays, request.form["StartTime"], request.form["EndTime"],
+        session.date, end_date
+    )
+    flash_extend(recurrence.extend(recurrence_ids={rid}))
+    return redirect(url_for("classes.list_recurrences"))
+
+@classes_bp.route("/recurrences/delete/<int:rid>", methods=["POST"])
+@login_required
+def delete_recurrence(rid):
+    removed = models.delete_recurrence(rid)
+    flash(f"Recurring schedule deleted with {removed} upcoming session(s).", "success")
+    return redirect(url_for("classes.list_recurrences"))
+
+@classes_bp.route("/recurrences/extend", methods=["POST"])
+@login_required
+def extend_recurrences():
+    flash_extend(recurrence.extend())
+    return redirect(url_for("classes.list_recurrences"))
+
+@classes_bp.route("/recurrences/exceptions/add", methods=["POST"])
+@login_required
+def add_schedule_exception():
+    try:
+        day = date.fromisoformat(request.form["ExceptionDate"])
+    except ValueError:
+        flash("Enter the date as YYYY-MM-DD.", "danger")
+        return redirect(url_for("classes.list_recurrences"))
+    rid = request.form.get("RecurrenceID") or None
+    cancelled = models.create_schedule_exception(day, request.form.get("Reason") or None, rid)
+    flash(f"{day} will be skipped; {cancelled} generated session(s) cancelled.", "success")
+    return redirect(url_for("classes.list_recurrences"))
+
+@classes_bp.route("/recurrences/exceptions/delete/<int:eid>", methods=["POST"])
+@login_required
+def delete_schedule_exception(eid):
+    models.delete_schedule_exception(eid)
+    flash("Exception removed; run Generate to restore its sessions.", "success")
+    return redirect(url_for("classes.list_recurrences"))
+
 @classes_bp.route("/attendance/add", methods=["GET", "POST"])
 @login_required
 def add_attendance():
@@ -117,8 +273,9 @@ def add_attendance():
     if request.method == "POST":
         member_id = request.form["MemberID"]
         schedule_id = request.form["ScheduleID"]
-        status = request.form.get("Status", "present")
-        models.create_attendance(member_id, schedule_id, status)
+        status = request.form.get("Status", "booked")
+        booking = models.create_attendance(member_id, schedule_id, status)
+        flash_booking(booking)
         return redirect(url_for("classes.list_classes"))
     return render_template("add_attendance.html", members=members, schedules=schedules)
 
@@ -132,12 +289,17 @@ def edit_attendance(aid):
         member_id = request.form["MemberID"]
         schedule_id = request.form["ScheduleID"]
         status = request.form.get("Status", "present")
-        models.update_attendance(aid, member_id, schedule_id, status)
+        booking = models.update_attendance(aid, member_id, schedule_id, status)
+        flash_booking(booking)
         return redirect(url_for("classes.list_classes"))
     return render_template("edit_attendance.html", attendance=attendance, members=members, schedules=schedules)
 
 @classes_bp.route("/attendance/delete/<int:aid>", methods=["POST"])
 @login_required
 def delete_attendance(aid):
-    models.delete_attendance(aid)
+    promoted = models.delete_attendance(aid)
+    if promoted is None:
+        flash("That booking no longer exists.", "danger")
+    elif promoted:
+        flash(f"Booking cancelled; {promoted} member(s) moved off the waitlist.", "success")
     return redirect(url_for("classes.list_classes"))
\ No newline at end of file
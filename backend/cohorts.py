@@ -0,0 +1,240 @@
+import hashlib
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+import models
+from revenue import LEDGER_TTL, day_numbers, month_date, month_number
+
+SOURCE_TABLES = ("MembershipHistory", "MembershipPlan")
+
+
+class Part:
+    """Additive counts for a subset of members; settled and live parts are summed"""
+
+    def __init__(self, cohorts, offsets, plans):
+        self.retention = np.zeros((cohorts, offsets), dtype=np.int64)
+        self.exits = np.zeros(plans, dtype=np.int64)
+        self.active = np.zeros(plans, dtype=np.int64)
+        self.plan_days = np.zeros(plans, dtype=np.int64)
+        self.tenure_days = 0
+        self.members = 0
+
+    def __add__(self, other):
+        total = Part(0, 0, 0)
+        total.retention = self.retention + other.retention
+        total.exits = self.exits + other.exits
+        total.active = self.active + other.active
+        total.plan_days = self.plan_days + other.plan_days
+        total.tenure_days = self.tenure_days + other.tenure_days
+        total.members = self.members + other.members
+        return total
+
+
+class History:
+    """Every plan period as compact arrays sorted by (member, start).
+
+    Members are contiguous runs in that order, so per-member figures are
+    reduceat calls over the run boundaries and plan changes are the places
+    where neighbouring rows differ. Members whose last period ended before
+    the current month can no longer change, so their counts are kept per
+    month across reloads (see `_settled`); only members still live are
+    recomputed on each call.
+    """
+
+    def __init__(self, periods, plans):
+        plans = sorted(plans, key=lambda p: p["PlanID"])
+        plan_ids = np.array([p["PlanID"] for p in plans], dtype=np.int64)
+        self.plan_ids = tuple(int(p) for p in plan_ids)
+        self.plan_names = [p["PlanName"] for p in plans] + ["Deleted plan"]
+        self.plan_fees = np.array([float(p["MonthlyFee"] or 0) for p in plans] + [0.0])
+        nplans = len(self.plan_names)
+
+        member, plan, start, end = zip(*periods) if periods else ([], [], [], [])
+        self.member = np.array(member, dtype=np.int64)
+        plan = np.array(plan, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(plan_ids, plan), max(len(plan_ids) - 1, 0))
+        known = plan_ids[idx] == plan if len(plan_ids) else np.zeros(len(plan), dtype=bool)
+        self.plan = np.where(known, idx, nplans - 1)
+        self.start = day_numbers(start)
+        self.end = day_numbers(end)
+
+        first = np.ones(len(self.member), dtype=bool)
+        first[1:] = self.member[1:] != self.member[:-1]
+        self.run_start = np.flatnonzero(first)
+        self.row_member = np.cumsum(first) - 1          # member slot of each row
+
+        if len(self.member):
+            self.join = self.start[self.run_start]
+            self.last_end = np.maximum.reduceat(self.end, self.run_start)
+            run_last = np.r_[self.run_start[1:] - 1, len(self.member) - 1]
+            self.last_plan = self.plan[run_last]
+        else:
+            self.join = self.last_end = self.last_plan = np.zeros(0, dtype=np.int64)
+        self.join_month = self.join.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+        # Plan changes: consecutive periods of the same member on different plans
+        change = ~first[1:] & (self.plan[1:] != self.plan[:-1])
+        moves = np.bincount(self.plan[:-1][change] * nplans + self.plan[1:][change], minlength=nplans * nplans)
+        self.moves = moves.reshape(nplans, nplans)
+        self.periods = np.bincount(self.plan, minlength=nplans)
+
+        self._fingerprint = None
+
+    def part(self, members, today, current_month, first_month):
+        """Counts for the member slots selected by the boolean mask `members`"""
+        nplans = len(self.plan_names)
+        cohorts = current_month - first_month + 1
+        part = Part(cohorts, cohorts, nplans)
+        # Future-dated joins belong to no cohort yet
+        members = members & (self.join <= today)
+        if not members.any():
+            return part
+
+        # Months a member stayed past their join month, capped at today
+        cohort = self.join_month[members] - first_month
+        stayed = np.minimum(self.last_end[members], today).astype("datetime64[D]") \
+            .astype("datetime64[M]").astype(np.int64) - self.join_month[members]
+        stayed = np.maximum(stayed, 0)
+        counts = np.bincount(cohort * cohorts + stayed, minlength=cohorts * cohorts)
+        # Members still there at offset k are those who stayed k months or more
+        part.retention = np.cumsum(counts.reshape(cohorts, cohorts)[:, ::-1], axis=1)[:, ::-1]
+
+        churned = members & (self.last_end < today)
+        part.exits = np.bincount(self.last_plan[churned], minlength=nplans)
+        part.members = int(members.sum())
+
+        rows = members[self.row_member]
+        covered = np.maximum(np.minimum(self.end[rows], today) - self.start[rows] + 1, 0)
+        part.plan_days = np.bincount(self.plan[rows], weights=covered, minlength=nplans).astype(np.int64)
+        part.tenure_days = int(covered.sum())
+        open_rows = rows & (self.start <= today) & (self.end >= today)
+        part.active = np.bincount(self.plan[open_rows], minlength=nplans)
+        return part
+
+    def fingerprint(self, members, current_month):
+        """Digest of the periods of the settled members, once per month per load"""
+        if self._fingerprint is None or self._fingerprint[0] != current_month:
+            rows = members[self.row_member]
+            digest = hashlib.sha1()
+            for column in (self.member, self.plan, self.start, self.end):
+                digest.update(column[rows].tobytes())
+            self._fingerprint = (current_month, (self.plan_ids, digest.hexdigest()))
+        return self._fingerprint[1]
+
+    def settled(self, month_start, current_month, first_month):
+        """Counts for members who left before this month, computed once per month.
+
+        Reused across reloads while those members' periods are unchanged, so a
+        write elsewhere in the history only costs the live part.
+        """
+        members = self.last_end < month_start
+        key = (current_month, first_month, self.fingerprint(members, current_month))
+        if _settled.get("key") != key:
+            _settled.update(key=key, part=self.part(members, month_start, current_month, first_month))
+        return _settled["part"]
+
+    def report(self, today, cohort_count=12):
+        current_month = month_number(today)
+        day = day_numbers([today])[0]
+        # Cohorts start at the earliest join that has happened; future-dated
+        # joins belong to no cohort yet
+        started = self.join <= day
+        if not started.any():
+            return empty_report(today)
+        first_month = int(self.join_month[started].min())
+        month_start = day_numbers([today.replace(day=1)])[0]
+
+        live = self.last_end >= month_start
+        total = self.settled(month_start, current_month, first_month) + self.part(live, day, current_month, first_month)
+
+        cohorts = []
+        for c in range(max(0, current_month - first_month - cohort_count + 1), current_month - first_month + 1):
+            size = int(total.retention[c, 0])
+            if not size:
+                continue
+            observed = current_month - first_month - c + 1
+            cohorts.append({
+                "month": month_date(first_month + c),
+                "size": size,
+                "retention": [round(100 * int(n) / size, 1) for n in total.retention[c, :observed]]
+            })
+
+        plans = []
+        for i, name in enumerate(self.plan_names):
+            periods = int(self.periods[i])
+            if not periods:
+                continue
+            plans.append({
+                "plan": name,
+                "periods": periods,
+                "active": int(total.active[i]),
+                "churned": int(total.exits[i]),
+                "churn_rate": round(100 * int(total.exits[i]) / periods, 1),
+                "avg_days": round(int(total.plan_days[i]) / periods, 1)
+            })
+
+        flows = []
+        for i, j in zip(*np.nonzero(self.moves)):
+            fee_change = self.plan_fees[j] - self.plan_fees[i]
+            flows.append({
+                "from": self.plan_names[i],
+                "to": self.plan_names[j],
+                "members": int(self.moves[i, j]),
+                "kind": "upgrade" if fee_change > 0 else "downgrade" if fee_change < 0 else "switch"
+            })
+        flows.sort(key=lambda f: -f["members"])
+
+        return {
+            "as_of": today,
+            "members": total.members,
+            "avg_tenure_days": round(total.tenure_days / total.members, 1) if total.members else 0.0,
+            "cohorts": cohorts,
+            "plans": plans,
+            "flows": flows,
+            "upgrades": sum(f["members"] for f in flows if f["kind"] == "upgrade"),
+            "downgrades": sum(f["members"] for f in flows if f["kind"] == "downgrade")
+        }
+
+
+def empty_report(today):
+    return {
+        "as_of": today, "members": 0, "avg_tenure_days": 0.0, "cohorts": [],
+        "plans": [], "flows": [], "upgrades": 0, "downgrades": 0
+    }
+
+
+_lock = threading.Lock()
+# Settled counts outlive the History they were computed from: {"key", "part"}
+_settled = {}
+_history = None
+_history_generation = None
+_history_loaded = 0.0
+
+
+def generation():
+    return tuple(models._generations.get(t, 0) for t in SOURCE_TABLES)
+
+
+def history():
+    """The loaded History, reloaded after a write to its tables or once stale"""
+    global _history, _history_generation, _history_loaded
+    current = generation()
+    with _lock:
+        fresh = time.monotonic() - _history_loaded < LEDGER_TTL
+        if _history is not None and _history_generation == current and fresh:
+            return _history
+    loaded = History(models.get_plan_periods(), models.get_all_plans())
+    with _lock:
+        if generation() == current:
+            _history, _history_generation, _history_loaded = loaded, current, time.monotonic()
+    return loaded
+
+
+def report(today=None, cohort_count=12):
+    h = history()
+    with _lock:
+        # settled() memoises on the shared object and in _settled
+        return h.report(today or date.today(), cohort_count)
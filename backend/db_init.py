@@ -3,7 +3,10 @@ import mysql.connector
 from mysql.connector import Error
 import logging
 from datetime import date, timedelta, datetime
-from werkzeug.security import generate_password_hash
+
+import db_pool
+import passwords
+import migrations
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,18 +14,11 @@ logger = logging.getLogger(__name__)
 
 def get_db_connection(include_db=True):
     """Get database connection with or without specifying database name"""
-    config = {
-        'host': os.getenv("DB_HOST", "localhost"),
-        'user': os.getenv("DB_USER", "root"),
-        'password': os.getenv("DB_PASS", ""),
-        'charset': 'utf8mb4',
-        'collation': 'utf8mb4_unicode_ci'
-    }
-    
-    if include_db:
-        config['database'] = os.getenv("DB_NAME", "gymdb")
-    
-    return mysql.connector.connect(**config)
+    # Without a database (i.e. before it exists) the pool can't be used
+    if not include_db:
+        return mysql.connector.connect(**db_pool.connection_config(include_db=False))
+
+    return db_pool.get_pool().connection()
 
 def create_database():
     """Create the database if it doesn't exist"""
@@ -206,7 +202,7 @@ def create_tables():
                 CREATE TABLE IF NOT EXISTS `User` (
                     UserID       INT             AUTO_INCREMENT PRIMARY KEY,
                     Username     VARCHAR(50)     NOT NULL UNIQUE,
-                    PasswordHash VARCHAR(128)    NOT NULL,
+                    PasswordHash VARCHAR(255)    NOT NULL,
                     Role         ENUM('admin','manager','trainer','member') NOT NULL
                 )
             """,
@@ -378,6 +374,9 @@ def initialize_database():
         
         # Step 2: Create tables
         create_tables()
+
+        # Step 2b: Bring indexes and column changes up to date
+        migrations.migrate()
         
         # Step 3: Ensure admin user if none exist
         create_default_admin()
@@ -421,7 +420,7 @@ def create_default_admin():
         if count == 0:
             admin_username = os.getenv("ADMIN_USER", "admin")
             admin_password = os.getenv("ADMIN_PASS", "admin")
-            hashed = generate_password_hash(admin_password, method="pbkdf2:sha256")
+            hashed = passwords.hash_password(admin_password)
             cursor.execute(
                 "INSERT INTO `User` (Username, PasswordHash, Role) VALUES (%s, %s, %s)",
                 (admin_username, hashed, "admin")
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+import mysql.connector
+from mysql.connector import Error
+
+
+def connection_config(include_db=True):
+    """Build the mysql.connector arguments from the environment"""
+    config = {
+        'host': os.getenv("DB_HOST", "localhost"),
+        'user': os.getenv("DB_USER", "root"),
+        'password': os.getenv("DB_PASS", ""),
+        'charset': 'utf8mb4',
+        'collation': 'utf8mb4_unicode_ci',
+        # Buffered cursors let one pooled connection serve many queries
+        # without "Unread result found" errors.
+        'buffered': True
+    }
+
+    if include_db:
+        config['database'] = os.getenv("DB_NAME", "gymdb")
+
+    return config
+
+
+class PoolTimeout(Error):
+    pass
+
+
+# Optional callable applied to every cursor handed out (see tracing.init_app)
+cursor_wrapper = None
+
+
+class PooledConnection:
+    """Proxy around a raw connection that hands it back to the pool on release"""
+
+    def __init__(self, pool, raw, bound=False):
+        self._pool = pool
+        self._raw = raw
+        self._bound = bound
+        self._released = False
+        # Unbound connections (models called outside a request) are often never
+        # released; return them when the proxy is garbage collected instead of
+        # losing the pool slot for good
+        self._finalizer = weakref.finalize(self, pool.release, raw)
+        self._finalizer.atexit = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cur = self._raw.cursor(*args, **kwargs)
+        return cursor_wrapper(cur) if cursor_wrapper else cur
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._finalizer.detach()
+            self._pool.release(self._raw)
+
+    def discard(self):
+        """Drop the connection instead of reusing it, e.g. mid-way through a result set"""
+        if not self._released:
+            self._released = True
+            self._finalizer.detach()
+            try:
+                self._raw.close()
+            except Exception:
+                pass
+            self._pool._forget()
+
+    def close(self):
+        # A connection bound to a request is returned on teardown, so callers
+        # closing it mid-request must not pull it out from under later queries.
+        if not self._bound:
+            self.release()
+
+
+class ConnectionPool:
+    def __init__(self, size=10, timeout=30, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.connect_args = connect_args
+
+        self._idle = deque()
+        self._created = 0
+        self._cond = threading.Condition()
+
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._checkout_time = 0.0
+        self._max_checkout_time = 0.0
+
+    def _checkout(self):
+        with self._cond:
+            waited = False
+            deadline = time.monotonic() + self.timeout
+            while not self._idle and self._created >= self.size:
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(msg=f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+            if waited:
+                self._waits += 1
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+            return None
+
+    def _forget(self):
+        with self._cond:
+            self._created -= 1
+            self._in_use -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def connection(self, bound=False):
+        """Check out a healthy connection, pinging idle ones before reuse"""
+        started = time.monotonic()
+        raw = self._checkout()
+        try:
+            if raw is None:
+                raw = mysql.connector.connect(**self.connect_args)
+            else:
+                raw.ping(reconnect=True, attempts=1, delay=0)
+        except Exception:
+            self._forget()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_time += elapsed
+            self._max_checkout_time = max(self._max_checkout_time, elapsed)
+        return PooledConnection(self, raw, bound=bound)
+
+    def release(self, raw):
+        try:
+            # Never hand the next borrower someone else's open transaction
+            raw.rollback()
+        except Exception:
+            try:
+                raw.close()
+            except Exception:
+                pass
+            self._forget()
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(raw)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "avg_checkout_ms": round(1000 * self._checkout_time / self._checkouts, 3) if self._checkouts else 0.0,
+                "max_checkout_ms": round(1000 * self._max_checkout_time, 3)
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=int(os.getenv("DB_POOL_SIZE", "10")),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                    **connection_config()
+                )
+    return _pool
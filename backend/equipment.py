@@ -2,16 +2,21 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 import functools
 import models
+import pagination
 from members import roles_required
+from etags import conditional
 
 equipment_bp = Blueprint("equipment", __name__, url_prefix="/equipment")
 
 @equipment_bp.route("/")
 @login_required
 @roles_required("admin","manager")
+@conditional("Equipment", "Room")
 def list_equipment():
-    items = models.get_all_equipment()
-    return render_template("equipment.html", equipment=items)
+    page = pagination.page_request(request.args, models.EQUIPMENT_KEYSET)
+    items = models.get_all_equipment(page=page)
+    rooms = models.get_all_rooms()
+    return render_template("equipment.html", equipment=items, page=items, rooms=rooms)
 
 @equipment_bp.route("/add", methods=["GET","POST"])
 @login_required
@@ -0,0 +1,55 @@
+import functools
+import hashlib
+import os
+import time
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+import models
+
+# Versions are bumped by every write made through models, in any process;
+# this bounds how long a tag survives writes made some other way (by hand)
+MAX_AGE = int(os.getenv("ETAG_MAX_AGE", "60"))
+
+
+def version_tag(tables):
+    """Strong ETag for the current request given the versions of the tables it reads"""
+    window = int(time.time() // MAX_AGE) if MAX_AGE > 0 else 0
+    parts = [
+        str(window),
+        ".".join(str(v) for v in models.table_versions(*tables)),
+        request.full_path,
+        request.headers.get("Accept", ""),
+        str(current_user.get_id()),
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def conditional(*tables):
+    """Answer GETs with 304 while none of `tables` has been written since the client's copy.
+
+    The check runs before the view, so an unchanged poll costs one
+    primary-key read of TableVersion. Pages carrying flash messages are
+    neither tagged nor short-circuited.
+    """
+    def wrapper(fn):
+        @functools.wraps(fn)
+        def decorated(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+                return fn(*args, **kwargs)
+
+            etag = version_tag(tables)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.update(("Accept", "Cookie"))
+            return response
+        return decorated
+    return wrapper
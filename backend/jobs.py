@@ -0,0 +1,128 @@
+"""Command-line entry point for the scheduled and one-off jobs, e.g. from cron:
+
+    python jobs.py reconcile
+    python jobs.py recurrence [days]
+    python jobs.py rollups [YYYY-MM [YYYY-MM]]
+    python jobs.py billing [YYYY-MM]
+    python jobs.py import-members members.csv
+
+Jobs run in an app context of their own, so every query in a run shares
+one pooled connection, but nothing in app.py is imported: no blueprints,
+and none of the background threads the web app starts.
+"""
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from flask import Flask
+
+import billing
+import member_import
+import models
+import reconcile
+import recurrence
+import rollups
+
+
+def month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_prefixed_env()
+    app.teardown_appcontext(models.close_db)
+    return app
+
+
+# ── Jobs ──
+def run_reconcile(args):
+    # Nightly when RECONCILE_INTERVAL is 0
+    result = reconcile.run()
+    if result is None:
+        print("Another reconcile run holds the lock")
+    else:
+        print(result.as_dict())
+
+
+def run_recurrence(args):
+    # Daily, to keep the horizon topped up
+    result = recurrence.extend(date.today() + timedelta(days=args.days))
+    for session, messages in result.skipped:
+        print(f"  skipped class {session.class_id} on {session.describe()}: {'; '.join(messages)}")
+
+
+def run_rollups(args):
+    # After editing Attendance by hand, or moving or deleting booked sessions
+    if args.months:
+        first, last = args.months[0], args.months[-1]
+    else:
+        first, last = rollups.schedule_span()
+    if first is None:
+        print("No sessions to roll up")
+    else:
+        months = rollups.rebuild_months(first, rollups.month_bounds(last)[1])
+        print(f"Rebuilt rollups for {months} month(s)")
+
+
+def run_billing(args):
+    # On the first of each month, or again after a crash
+    result = billing.run(args.month)
+    if result is None:
+        print("Another billing run holds the lock for that month")
+    else:
+        print(result.as_dict())
+
+
+def run_import_members(args):
+    def show(report):
+        print(f"  {report.processed} rows read, {report.imported} imported, "
+              f"{report.duplicates} duplicates, {report.rejected_count} rejected, {report.failed} failed")
+
+    with open(args.path, encoding="utf-8-sig", newline="") as f:
+        result = member_import.import_members(f, on_progress=show)
+
+    show(result)
+    for line, reason in result.rejected:
+        print(f"  line {line}: {reason}")
+    for lines, error in result.batch_errors:
+        print(f"  lines {lines} not imported: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gym management jobs")
+    jobs = parser.add_subparsers(dest="job", required=True)
+
+    job = jobs.add_parser("reconcile", help="set membership status and plan from the history periods")
+    job.set_defaults(run=run_reconcile)
+
+    job = jobs.add_parser("recurrence", help="generate recurring class sessions up to the horizon")
+    job.add_argument("days", type=int, nargs="?", default=recurrence.HORIZON_DAYS)
+    job.set_defaults(run=run_recurrence)
+
+    job = jobs.add_parser("rollups", help="rebuild attendance rollups for a month, a range, or every month")
+    job.add_argument("months", type=month, nargs="*", metavar="YYYY-MM")
+    job.set_defaults(run=run_rollups)
+
+    job = jobs.add_parser("billing", help="invoice active members for a month, this one by default")
+    job.add_argument("month", type=month, nargs="?", metavar="YYYY-MM")
+    job.set_defaults(run=run_billing)
+
+    job = jobs.add_parser("import-members", help="import members from a CSV file")
+    job.add_argument("path", metavar="members.csv")
+    job.set_defaults(run=run_import_members)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    with create_app().app_context():
+        args.run(args)
+
+
+if __name__ == "__main__":
+    main()
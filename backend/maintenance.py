@@ -5,17 +5,20 @@ from models import (
     update_maintenance_resolution,
     get_maintenance_log_by_id,
     get_all_equipment,         
-    get_all_users               
+    get_all_users,
+    MAINTENANCE_LOG_KEYSET
 )
 from models import get_all_users
 from models import delete_maintenance_log  
+import pagination
 
 maintenance_bp = Blueprint('maintenance', __name__, template_folder='templates')
 
 @maintenance_bp.route("/maintenance", methods=["GET"])
 def get_logs():
-    logs = get_all_maintenance_logs()
-    return render_template("maintenance_logs.html", logs=logs)
+    page = pagination.page_request(request.args, MAINTENANCE_LOG_KEYSET)
+    logs = get_all_maintenance_logs(page=page)
+    return render_template("maintenance_logs.html", logs=logs, page=logs)
 
 @maintenance_bp.route("/maintenance/logs/new", methods=["GET", "POST"])
 def add_maintenance_log():
@@ -0,0 +1,169 @@
+import csv
+import io
+import logging
+from datetime import date
+
+import mysql.connector
+
+import models
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = models.BULK_BATCH_SIZE
+MAX_REPORTED_REJECTS = 200
+
+COLUMNS = [
+    "FirstName", "LastName", "Email",
+    "DateOfBirth", "PhoneNumber",
+    "CurrentPlanID", "MembershipStatus", "MembershipStartDate"
+]
+REQUIRED = ["FirstName", "LastName", "Email"]
+# VARCHAR sizes from the Member table
+MAX_LENGTHS = {
+    "FirstName": 50, "LastName": 50, "Email": 100,
+    "PhoneNumber": 20, "MembershipStatus": 20
+}
+
+# Accepted CSV headers, compared lower-cased with spaces/underscores removed
+HEADER_ALIASES = {
+    "firstname": "FirstName", "first": "FirstName",
+    "lastname": "LastName", "last": "LastName", "surname": "LastName",
+    "email": "Email",
+    "dateofbirth": "DateOfBirth", "dob": "DateOfBirth",
+    "phonenumber": "PhoneNumber", "phone": "PhoneNumber",
+    "planname": "PlanName", "plan": "PlanName",
+    "currentplanid": "CurrentPlanID", "planid": "CurrentPlanID",
+    "membershipstatus": "MembershipStatus", "status": "MembershipStatus",
+    "membershipstartdate": "MembershipStartDate", "startdate": "MembershipStartDate"
+}
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.batch_errors = []
+        self.rejected_count = 0
+        self.rejected = []
+
+    def reject(self, line, reason):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTS:
+            self.rejected.append((line, reason))
+
+
+def map_headers(fieldnames):
+    mapping = {}
+    for name in fieldnames or []:
+        key = name.strip().lower().replace(" ", "").replace("_", "")
+        if key in HEADER_ALIASES:
+            mapping[name] = HEADER_ALIASES[key]
+
+    missing = [c for c in REQUIRED if c not in mapping.values()]
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+    return mapping
+
+
+def parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def parse_row(raw, mapping, plans):
+    """Turn one CSV row into a Member tuple ordered like COLUMNS, or raise ValueError"""
+    row = {mapping[k]: (v or "").strip() for k, v in raw.items() if k in mapping}
+
+    for col in REQUIRED:
+        if not row.get(col):
+            raise ValueError(f"{col} is required")
+    if "@" not in row["Email"]:
+        raise ValueError(f"invalid email {row['Email']!r}")
+    for col, limit in MAX_LENGTHS.items():
+        if len(row.get(col) or "") > limit:
+            raise ValueError(f"{col} is longer than {limit} characters")
+
+    plan_id = row.get("CurrentPlanID") or None
+    if row.get("PlanName"):
+        plan_id = plans.get(row["PlanName"].lower())
+        if plan_id is None:
+            raise ValueError(f"unknown plan {row['PlanName']!r}")
+    elif plan_id is not None:
+        if not plan_id.isdigit() or int(plan_id) not in plans.values():
+            raise ValueError(f"unknown plan id {plan_id!r}")
+        plan_id = int(plan_id)
+
+    try:
+        dob = parse_date(row.get("DateOfBirth"))
+        start = parse_date(row.get("MembershipStartDate"))
+    except ValueError:
+        raise ValueError("dates must be YYYY-MM-DD")
+
+    return (
+        row["FirstName"], row["LastName"], row["Email"],
+        dob, row.get("PhoneNumber") or None,
+        plan_id, row.get("MembershipStatus") or "active", start
+    )
+
+
+def import_members(stream, on_progress=None):
+    """Import members from a CSV text stream in batched transactions.
+
+    Rows are read one at a time, so the file is never held in memory.
+    Emails already present in the file or the database are skipped as
+    duplicates; invalid rows are rejected with their line number. A batch
+    the database refuses is reported as failed and the import carries on.
+    """
+    reader = csv.DictReader(stream)
+    mapping = map_headers(reader.fieldnames)
+    plans = {p["PlanName"].lower(): p["PlanID"] for p in models.get_all_membership_plans()}
+
+    report = ImportReport()
+    seen = set()
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        taken = models.existing_values("Member", "Email", [r[2] for _, r in batch])
+        fresh = [r for _, r in batch if r[2].lower() not in taken]
+        report.duplicates += len(batch) - len(fresh)
+        if fresh:
+            try:
+                models.bulk_insert("Member", COLUMNS, fresh)
+                report.imported += len(fresh)
+            except mysql.connector.Error as e:
+                report.failed += len(fresh)
+                report.batch_errors.append((f"{batch[0][0]}-{batch[-1][0]}", str(e)))
+        batch.clear()
+        logger.info(f"Member import: {report.processed} rows read, {report.imported} imported")
+        if on_progress:
+            on_progress(report)
+
+    for raw in reader:
+        report.processed += 1
+        try:
+            member = parse_row(raw, mapping, plans)
+        except ValueError as e:
+            report.reject(reader.line_num, str(e))
+            continue
+
+        email = member[2].lower()
+        if email in seen:
+            report.duplicates += 1
+            continue
+        seen.add(email)
+
+        batch.append((reader.line_num, member))
+        if len(batch) >= BATCH_SIZE:
+            flush()
+
+    flush()
+    return report
+
+
+def open_upload(upload):
+    """Wrap an uploaded file so csv can read it without loading it all"""
+    return io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+
@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
 from flask_login import login_required, current_user
 import functools
 import models
+import pagination
+import member_import
+from etags import conditional
 
 members_bp = Blueprint("members", __name__, url_prefix="/members")
 
+MAX_SEARCH_RESULTS = 50
+
 def roles_required(*roles):
     def wrapper(fn):
         @functools.wraps(fn)
@@ -18,9 +23,31 @@ def roles_required(*roles):
 @members_bp.route("/")
 @login_required
 @roles_required("admin", "manager", "trainer")
+@conditional("Member", "MembershipPlan")
 def list_members():
-    ms = models.get_all_members()
-    return render_template("members.html", members=ms)
+    page = pagination.page_request(request.args, models.MEMBER_KEYSET)
+    ms = models.get_all_members(page=page)
+    plans = models.get_all_membership_plans()
+    return render_template("members.html", members=ms, page=ms, plans=plans)
+
+@members_bp.route("/search")
+@login_required
+@roles_required("admin", "manager", "trainer")
+def search_members():
+    """Typeahead: ranked prefix matches on name, email or phone"""
+    limit = max(1, min(request.args.get("limit", 10, type=int), MAX_SEARCH_RESULTS))
+    rows = models.member_index.search(request.args.get("q", ""), limit)
+    return jsonify([
+        {
+            "memberId": r["MemberID"],
+            "name": f"{r['FirstName']} {r['LastName']}",
+            "email": r["Email"],
+            "phone": r["PhoneNumber"],
+            "membershipStatus": r["MembershipStatus"],
+            "url": url_for("members.edit_member", mid=r["MemberID"])
+        }
+        for r in rows
+    ])
 
 @members_bp.route("/add", methods=["GET", "POST"])
 @login_required
@@ -53,6 +80,25 @@ def add_member():
 
     return render_template("add_member.html", plans=plans)
 
+@members_bp.route("/import", methods=["GET", "POST"])
+@login_required
+@roles_required("admin", "manager")
+def import_members():
+    report = None
+
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Choose a CSV file to import.", "error")
+        else:
+            try:
+                report = member_import.import_members(member_import.open_upload(upload))
+                flash(f"Imported {report.imported} of {report.processed} members.", "error" if report.failed else "success")
+            except (ValueError, UnicodeDecodeError) as e:
+                flash(f"Import failed: {e}", "error")
+
+    return render_template("import_members.html", report=report)
+
 @members_bp.route("/edit/<int:mid>", methods=["GET", "POST"])
 @login_required
 @roles_required("admin", "manager")
@@ -2,8 +2,9 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from models import (
     get_all_membership_plans, add_membership_plan, delete_membership_plan,
     get_membership_history, add_membership_history,
-    get_all_members,  
+    get_all_members, HISTORY_KEYSET,
 )
+import pagination
 
 membership_bp = Blueprint("membership", __name__, template_folder="templates")
 
@@ -32,8 +33,10 @@ def delete_plan(plan_id):
 
 @membership_bp.route("/history")
 def view_history():
-    history = get_membership_history()  
-    return render_template("membership_history.html", history=history)
+    page = pagination.page_request(request.args, HISTORY_KEYSET)
+    history = get_membership_history(page=page)
+    plans = get_all_membership_plans()
+    return render_template("membership_history.html", history=history, page=history, plans=plans)
 
 @membership_bp.route("/history/add", methods=["GET", "POST"])
 def add_history():
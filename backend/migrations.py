@@ -0,0 +1,318 @@
+import logging
+
+import db_pool
+import rollups
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "gymdb_schema_migrations"
+LOCK_TIMEOUT = 60
+
+
+# ── Idempotent Steps ──
+def index_exists(cur, table, name):
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    return cur.fetchone() is not None
+
+def add_index(table, name, columns, unique=False):
+    def step(cur):
+        if not index_exists(cur, table, name):
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            cur.execute(f"CREATE {kind} `{name}` ON `{table}` ({', '.join(f'`{c}`' for c in columns)})")
+    return step
+
+def add_column(table, column, definition):
+    def step(cur):
+        if column_type(cur, table, column) is None:
+            cur.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+    return step
+
+def create_table(sql):
+    # Statements are written CREATE TABLE IF NOT EXISTS, so re-running is harmless
+    def step(cur):
+        cur.execute(sql)
+    return step
+
+def foreign_key_exists(cur, table, name):
+    cur.execute("""
+        SELECT 1 FROM information_schema.table_constraints
+        WHERE table_schema = DATABASE() AND table_name = %s
+          AND constraint_name = %s AND constraint_type = 'FOREIGN KEY'
+    """, (table, name))
+    return cur.fetchone() is not None
+
+def add_foreign_key(table, name, definition):
+    def step(cur):
+        if not foreign_key_exists(cur, table, name):
+            cur.execute(f"ALTER TABLE `{table}` ADD CONSTRAINT `{name}` FOREIGN KEY {definition}")
+    return step
+
+def drop_index(table, name):
+    def step(cur):
+        if index_exists(cur, table, name):
+            cur.execute(f"DROP INDEX `{name}` ON `{table}`")
+    return step
+
+def delete_duplicates(table, pk, columns):
+    """Keep the oldest row for each combination of columns, so a unique index can go on"""
+    def step(cur):
+        match = " AND ".join(f"a.`{c}` = b.`{c}`" for c in columns)
+        cur.execute(f"""
+            DELETE a FROM `{table}` a
+            JOIN `{table}` b ON {match} AND a.`{pk}` > b.`{pk}`
+        """)
+    return step
+
+def column_type(cur, table, column):
+    cur.execute("""
+        SELECT column_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return row[0].decode() if isinstance(row[0], bytes) else row[0]
+
+def modify_column(table, column, definition, expected_type):
+    def step(cur):
+        if (column_type(cur, table, column) or "").lower() != expected_type:
+            cur.execute(f"ALTER TABLE `{table}` MODIFY `{column}` {definition}")
+    return step
+
+
+# ── Migrations ──
+# Append only: each entry is (version, description, steps). Steps must be
+# safe to re-run, since a crash can land between a step and its version row.
+MIGRATIONS = [
+    (1, "Index hot lookup columns", [
+        add_index("ClassSchedule", "idx_schedule_date", ["ScheduleDate", "StartTime"]),
+        add_index("Attendance", "idx_attendance_schedule_member", ["ScheduleID", "MemberID"]),
+        add_index("Payments", "idx_payments_member_date", ["MemberID", "PaymentDate"]),
+        add_index("MembershipHistory", "idx_history_member_start", ["MemberID", "StartDate"]),
+        add_index("MaintenanceLog", "idx_maintenance_status", ["ResolutionStatus"]),
+        add_index("CalendarEvent", "idx_event_start", ["StartTime"]),
+    ]),
+    (2, "Widen User.PasswordHash for longer hash methods", [
+        modify_column("User", "PasswordHash", "VARCHAR(255) NOT NULL", "varchar(255)"),
+    ]),
+    (3, "Index CalendarEvent time ranges for overlap queries", [
+        add_index("CalendarEvent", "idx_event_range", ["StartTime", "EndTime"]),
+        # Its leftmost column makes the single-column index redundant
+        drop_index("CalendarEvent", "idx_event_start"),
+    ]),
+    (4, "One booking per member per session", [
+        delete_duplicates("Attendance", "AttendanceID", ["ScheduleID", "MemberID"]),
+        add_index("Attendance", "uq_attendance_schedule_member", ["ScheduleID", "MemberID"], unique=True),
+        drop_index("Attendance", "idx_attendance_schedule_member"),
+    ]),
+    (5, "Recurring class schedules", [
+        create_table("""
+            CREATE TABLE IF NOT EXISTS ClassRecurrence (
+                RecurrenceID     INT AUTO_INCREMENT PRIMARY KEY,
+                ClassID          INT NOT NULL,
+                Weekdays         VARCHAR(27) NOT NULL,
+                StartTime        TIME NOT NULL,
+                EndTime          TIME NOT NULL,
+                StartDate        DATE NOT NULL,
+                EndDate          DATE,
+                GeneratedThrough DATE,
+                FOREIGN KEY (ClassID)
+                    REFERENCES FitnessClass(ClassID) ON DELETE CASCADE
+            )
+        """),
+        create_table("""
+            CREATE TABLE IF NOT EXISTS ScheduleException (
+                ExceptionID   INT AUTO_INCREMENT PRIMARY KEY,
+                RecurrenceID  INT,
+                ExceptionDate DATE NOT NULL,
+                Reason        VARCHAR(255),
+                FOREIGN KEY (RecurrenceID)
+                    REFERENCES ClassRecurrence(RecurrenceID) ON DELETE CASCADE,
+                INDEX idx_exception_date (ExceptionDate)
+            )
+        """),
+        add_column("ClassSchedule", "RecurrenceID", "INT NULL"),
+        add_foreign_key(
+            "ClassSchedule", "fk_schedule_recurrence",
+            "(RecurrenceID) REFERENCES ClassRecurrence(RecurrenceID) ON DELETE SET NULL"
+        ),
+        add_index("ClassSchedule", "uq_schedule_recurrence_date", ["RecurrenceID", "ScheduleDate"], unique=True),
+    ]),
+    (6, "Member check-ins", [
+        create_table("""
+            CREATE TABLE IF NOT EXISTS CheckIn (
+                CheckInID   INT AUTO_INCREMENT PRIMARY KEY,
+                MemberID    INT NOT NULL,
+                RoomID      INT,
+                ScheduleID  INT,
+                CheckInTime DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (MemberID)
+                    REFERENCES Member(MemberID) ON DELETE CASCADE,
+                FOREIGN KEY (RoomID)
+                    REFERENCES Room(RoomID) ON DELETE SET NULL,
+                FOREIGN KEY (ScheduleID)
+                    REFERENCES ClassSchedule(ScheduleID) ON DELETE SET NULL,
+                INDEX idx_checkin_member_time (MemberID, CheckInTime),
+                INDEX idx_checkin_time (CheckInTime)
+            )
+        """),
+        add_index("Member", "idx_member_phone", ["PhoneNumber"]),
+    ]),
+    (7, "Attendance rollups", [
+        create_table("""
+            CREATE TABLE IF NOT EXISTS ClassDailyStats (
+                ClassID    INT  NOT NULL,
+                StatDate   DATE NOT NULL,
+                Booked     INT  NOT NULL DEFAULT 0,
+                Present    INT  NOT NULL DEFAULT 0,
+                Waitlisted INT  NOT NULL DEFAULT 0,
+                PRIMARY KEY (ClassID, StatDate),
+                FOREIGN KEY (ClassID)
+                    REFERENCES FitnessClass(ClassID) ON DELETE CASCADE,
+                INDEX idx_class_stats_date (StatDate)
+            )
+        """),
+        create_table("""
+            CREATE TABLE IF NOT EXISTS RoomHourlyOccupancy (
+                RoomID   INT     NOT NULL,
+                StatDate DATE    NOT NULL,
+                StatHour TINYINT NOT NULL,
+                Present  INT     NOT NULL DEFAULT 0,
+                PRIMARY KEY (RoomID, StatDate, StatHour),
+                FOREIGN KEY (RoomID)
+                    REFERENCES Room(RoomID) ON DELETE CASCADE,
+                INDEX idx_room_occupancy_date (StatDate)
+            )
+        """),
+        create_table("""
+            CREATE TABLE IF NOT EXISTS MemberMonthlyVisits (
+                MemberID  INT  NOT NULL,
+                StatMonth DATE NOT NULL,
+                Visits    INT  NOT NULL DEFAULT 0,
+                PRIMARY KEY (MemberID, StatMonth),
+                FOREIGN KEY (MemberID)
+                    REFERENCES Member(MemberID) ON DELETE CASCADE,
+                INDEX idx_member_visits_month (StatMonth)
+            )
+        """),
+        # Backfill from the existing attendance in the same migration
+        lambda cur: rollups.rebuild(cur),
+    ]),
+    (8, "Membership change log", [
+        create_table("""
+            CREATE TABLE IF NOT EXISTS MembershipChange (
+                ChangeID  INT AUTO_INCREMENT PRIMARY KEY,
+                MemberID  INT         NOT NULL,
+                Field     VARCHAR(30) NOT NULL,
+                OldValue  VARCHAR(50),
+                NewValue  VARCHAR(50),
+                Source    VARCHAR(30) NOT NULL,
+                ChangedAt DATETIME    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (MemberID)
+                    REFERENCES Member(MemberID) ON DELETE CASCADE,
+                INDEX idx_change_member (MemberID, ChangeID)
+            )
+        """),
+        # Covers the open-period lookup per member
+        add_index("MembershipHistory", "idx_history_member_period", ["MemberID", "StartDate", "EndDate"]),
+        drop_index("MembershipHistory", "idx_history_member_start"),
+    ]),
+    (9, "Monthly billing runs", [
+        # Set only on generated invoices; NULLs keep manual payments unconstrained
+        add_column("Payments", "BillingMonth", "DATE NULL"),
+        add_index("Payments", "uq_payments_member_billing", ["MemberID", "BillingMonth"], unique=True),
+        create_table("""
+            CREATE TABLE IF NOT EXISTS BillingRun (
+                BillingMonth DATE        PRIMARY KEY,
+                LastMemberID INT         NOT NULL DEFAULT 0,
+                Created      INT         NOT NULL DEFAULT 0,
+                Status       VARCHAR(20) NOT NULL,
+                StartedAt    DATETIME    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FinishedAt   DATETIME
+            )
+        """),
+    ]),
+    (10, "Index CalendarEvent durations for the overlap lower bound", [
+        # MAX() over an indexed column is a single index lookup
+        add_column("CalendarEvent", "DurationSeconds",
+                   "INT AS (TIMESTAMPDIFF(SECOND, StartTime, EndTime)) STORED"),
+        add_index("CalendarEvent", "idx_event_duration", ["DurationSeconds"]),
+    ]),
+    (11, "Shared table versions for conditional GETs", [
+        create_table("""
+            CREATE TABLE IF NOT EXISTS TableVersion (
+                TableName VARCHAR(64) PRIMARY KEY,
+                Version   BIGINT      NOT NULL DEFAULT 0
+            )
+        """),
+    ]),
+    (12, "Index member phone numbers as digits", [
+        # Lookups normalize the phone typed at the kiosk the same way
+        add_column("Member", "PhoneDigits",
+                   "VARCHAR(20) AS (NULLIF(REGEXP_REPLACE(PhoneNumber, '[^0-9]', ''), '')) STORED"),
+        add_index("Member", "idx_member_phone_digits", ["PhoneDigits"]),
+        drop_index("Member", "idx_member_phone"),
+    ]),
+]
+
+
+def ensure_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS SchemaVersion (
+            Version     INT          PRIMARY KEY,
+            Description VARCHAR(255) NOT NULL,
+            AppliedAt   DATETIME     DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def current_version(cur):
+    cur.execute("SELECT COALESCE(MAX(Version), 0) FROM SchemaVersion")
+    return cur.fetchone()[0]
+
+def migrate():
+    """Apply every pending migration in order; returns the resulting schema version"""
+    connection = db_pool.get_pool().connection()
+    cursor = connection.cursor()
+    try:
+        # Several workers may start at once; only one should migrate
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for the schema migration lock")
+
+        try:
+            ensure_version_table(cursor)
+            version = current_version(cursor)
+
+            for number, description, steps in MIGRATIONS:
+                if number <= version:
+                    continue
+                logger.info(f"Applying migration {number}: {description}")
+                for step in steps:
+                    step(cursor)
+                cursor.execute(
+                    "INSERT INTO SchemaVersion (Version, Description) VALUES (%s, %s)",
+                    (number, description)
+                )
+                connection.commit()
+                version = number
+
+            logger.info(f"Schema is at version {version}")
+            return version
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    migrate()
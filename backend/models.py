@@ -1,17 +1,292 @@
 import os
+import bisect
+import functools
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
 import mysql.connector
-from flask import flash
+from flask import flash, g, has_app_context
 from flask_login import UserMixin
 
-from werkzeug.security import generate_password_hash
+
+import db_pool
+import passwords
+from pagination import Keyset, fetch_page
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 def get_db():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST", "localhost"),
-        user=os.getenv("DB_USER", "root"),
-        password=os.getenv("DB_PASS", ""),
-        database=os.getenv("DB_NAME", "gymdb")
+    # Inside a request every call shares one pooled connection, returned on teardown
+    if not has_app_context():
+        # Returned to the pool once the caller drops it (see PooledConnection)
+        return db_pool.get_pool().connection()
+    if "db" not in g:
+        g.db = db_pool.get_pool().connection(bound=True)
+    return g.db
+
+def close_db(e=None):
+    db = g.pop("db", None)
+    if db is not None:
+        db.release()
+
+def stream_rows(select_sql, pk, after=None, limit=None, batch_size=500):
+    """Yield rows of select_sql in pk order without holding the result set in memory.
+
+    The query runs and the first batch is fetched before this returns, so a
+    failure still reaches the view as an error status rather than cutting
+    off a response that has already started.
+    """
+    sql, args = select_sql, []
+    if after is not None:
+        sql += f" WHERE {pk} > %s"
+        args.append(after)
+    sql += f" ORDER BY {pk}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        args.append(limit)
+
+    # The request's connection with an unbuffered (server-side) cursor, so rows
+    # arrive batch by batch. Flask tears the app context down before a
+    # streamed body is sent, so the connection is taken off the request here
+    # and the generator releases it when it finishes.
+    db = get_db()
+    if has_app_context() and g.get("db") is db:
+        g.pop("db")
+    try:
+        cur = db.cursor(dictionary=True, buffered=False)
+        cur.execute(sql, tuple(args))
+        rows = cur.fetchmany(batch_size)
+    except Exception:
+        db.discard()
+        raise
+    return _stream(db, cur, rows, batch_size)
+
+def _stream(db, cur, rows, batch_size):
+    finished = False
+    try:
+        while rows:
+            yield from rows
+            rows = cur.fetchmany(batch_size)
+        cur.close()
+        finished = True
+    finally:
+        if finished:
+            db.release()
+        else:
+            # Abandoned mid-way through the result set; the connection can't be reused
+            db.discard()
+
+# ── Bulk Writes ──
+BULK_BATCH_SIZE = 500
+# A field the caller left out: the column keeps its current value on upsert
+# and takes its default on insert
+OMITTED = object()
+
+def bulk_insert(table, columns, rows, unique=None, batch_size=BULK_BATCH_SIZE):
+    """Insert rows (tuples ordered like columns) in a single transaction.
+
+    With unique set to a UNIQUE column, rows whose key already exists are
+    updated instead, touching only the columns the row does not mark
+    OMITTED. Returns "created"/"updated" for each row, in order.
+    """
+    db = get_db(); cur = db.cursor()
+    statuses = []
+    try:
+        if unique:
+            # Decide created/updated in input order before anything is written
+            key_index = columns.index(unique)
+            keys = [r[key_index] for r in rows]
+            seen = set()
+            for start in range(0, len(keys), batch_size):
+                chunk = [k for k in keys[start:start + batch_size] if k is not OMITTED]
+                if not chunk:
+                    continue
+                cur.execute(
+                    f"SELECT `{unique}` FROM `{table}` WHERE `{unique}` IN ({', '.join(['%s'] * len(chunk))})",
+                    tuple(chunk)
+                )
+                # UNIQUE columns use a case-insensitive collation
+                seen.update(str(r[0]).lower() for r in cur.fetchall())
+            for key in keys:
+                key = str(key).lower()
+                statuses.append("updated" if key in seen else "created")
+                seen.add(key)
+        else:
+            statuses = ["created"] * len(rows)
+
+        # Consecutive rows sending the same columns share a statement, so
+        # the writes still land in input order
+        start = 0
+        while start < len(rows):
+            present = [v is not OMITTED for v in rows[start]]
+            stop = start + 1
+            while stop < len(rows) and stop - start < batch_size and \
+                    [v is not OMITTED for v in rows[stop]] == present:
+                stop += 1
+            used = [c for c, keep in zip(columns, present) if keep]
+            sql = f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in used)}) VALUES ({', '.join(['%s'] * len(used))})"
+            if unique:
+                updates = ", ".join(f"`{c}`=VALUES(`{c}`)" for c in used if c != unique) or f"`{unique}`=`{unique}`"
+                sql += f" ON DUPLICATE KEY UPDATE {updates}"
+            cur.executemany(sql, [
+                tuple(v for v, keep in zip(row, present) if keep) for row in rows[start:stop]
+            ])
+            start = stop
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        invalidate_table(table)
+    return statuses
+
+def existing_values(table, column, values):
+    """Return which of values already exist in table.column, lower-cased"""
+    found = set()
+    values = list(values)
+    db = get_db(); cur = db.cursor()
+    for start in range(0, len(values), BULK_BATCH_SIZE):
+        chunk = values[start:start + BULK_BATCH_SIZE]
+        cur.execute(
+            f"SELECT `{column}` FROM `{table}` WHERE `{column}` IN ({', '.join(['%s'] * len(chunk))})",
+            tuple(chunk)
+        )
+        found.update(str(r[0]).lower() for r in cur.fetchall())
+    return found
+
+# ── Reference Table Cache ──
+# Plans, rooms, trainers and staff change rarely but back nearly every form,
+# so their reads are served from memory until a write to the table lands.
+reference_cache = TTLCache(
+    maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("CACHE_TTL", "300"))
+)
+_generations = {}
+_MISSING = object()
+
+def _copy_rows(value):
+    if isinstance(value, list):
+        return [dict(r) for r in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+def cached(table):
+    def wrapper(fn):
+        @functools.wraps(fn)
+        def decorated(*args, **kwargs):
+            # Paged reads go straight to the database
+            if kwargs.get("page") is not None:
+                return fn(*args, **kwargs)
+            key = (table, fn.__name__, args, tuple(sorted(kwargs.items())))
+            value = reference_cache.get(key, _MISSING)
+            if value is _MISSING:
+                generation = _generations.get(table, 0)
+                value = fn(*args, **kwargs)
+                # Skip the store if a write raced with this read
+                if _generations.get(table, 0) == generation:
+                    reference_cache.set(key, value)
+            return _copy_rows(value)
+        return decorated
+    return wrapper
+
+def bump_version(table):
+    """Record a write to table for conditional GETs (see etags.py).
+
+    The counter lives in TableVersion so every worker and cron job shares
+    it. It is bumped after the write has committed, so a reader can see new
+    rows under the old version (and revalidate next time) but never the
+    reverse.
+    """
+    try:
+        db = get_db(); cur = db.cursor()
+        cur.execute("""
+            INSERT INTO TableVersion (TableName, Version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE Version = Version + 1
+        """, (table,))
+        db.commit()
+    except mysql.connector.Error as e:
+        # Never mask the write's own outcome; ETags fall back on ETAG_MAX_AGE
+        logger.warning(f"Could not bump TableVersion for {table}: {e}")
+
+def table_versions(*tables):
+    db = get_db(); cur = db.cursor()
+    cur.execute(
+        f"SELECT TableName, Version FROM TableVersion WHERE TableName IN ({', '.join(['%s'] * len(tables))})",
+        tables
     )
+    found = dict(cur.fetchall())
+    return tuple(found.get(t, 0) for t in tables)
+
+def invalidate_table(table):
+    _generations[table] = _generations.get(table, 0) + 1
+    bump_version(table)
+    reference_cache.invalidate(lambda key: key[0] == table)
+
+def invalidates(table):
+    def wrapper(fn):
+        @functools.wraps(fn)
+        def decorated(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                invalidate_table(table)
+        return decorated
+    return wrapper
+
+def touches(table):
+    """Bump table's version after a write without dropping cached reads.
+
+    For tables whose in-memory copies are patched in place (Member) or
+    that have no cached readers at all.
+    """
+    def wrapper(fn):
+        @functools.wraps(fn)
+        def decorated(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                bump_version(table)
+        return decorated
+    return wrapper
+
+def cache_stats():
+    return reference_cache.stats()
+
+# ── Admin Dashboard Stats ──
+# One aggregate round-trip, kept as a short-lived snapshot so repeated
+# dashboard loads don't touch the database at all.
+stats_cache = TTLCache(maxsize=1, ttl=float(os.getenv("STATS_TTL", "30")))
+
+def get_admin_stats():
+    snapshot = stats_cache.get("admin")
+    if snapshot is not None:
+        return snapshot
+
+    today = date.today()
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM `User`) AS user_count,
+            (SELECT COUNT(*) FROM Member) AS member_count,
+            (SELECT COUNT(*) FROM Member WHERE MembershipStatus = 'active') AS active_member_count,
+            (SELECT COUNT(*) FROM Trainer) AS trainer_count,
+            (SELECT COUNT(*) FROM Equipment) AS equipment_count,
+            (SELECT COUNT(*) FROM Payments) AS payment_count,
+            (SELECT COALESCE(SUM(Amount), 0) FROM Payments
+              WHERE PaymentDate >= %s AND {COLLECTED_PAYMENT_SQL}) AS revenue_this_month,
+            (SELECT COUNT(*) FROM MaintenanceLog WHERE ResolutionStatus <> 'resolved') AS pending_maintenance_count,
+            (SELECT COUNT(*) FROM ClassSchedule WHERE ScheduleDate = %s) AS classes_today
+    """, (today.replace(day=1), today))
+    snapshot = cur.fetchone()
+    snapshot["generated_at"] = datetime.now()
+    stats_cache.set("admin", snapshot)
+    return snapshot
 
 # ── User Model ──
 class User(UserMixin):
@@ -26,7 +301,7 @@ class User(UserMixin):
         return self.Role
 
 def create_user(username, raw_password, role="member"):
-    pw_hash = generate_password_hash(raw_password, method="pbkdf2:sha256")
+    pw_hash = passwords.hash_password(raw_password)
     db = get_db(); cur = db.cursor()
     cur.execute(
         "INSERT INTO `User` (Username, PasswordHash, Role) VALUES (%s, %s, %s)",
@@ -46,8 +321,36 @@ def get_user_by_id(uid):
     row = cur.fetchone()
     return None if not row else User(row["UserID"], row["Username"], row["PasswordHash"], row["Role"])
 
-def get_all_users():
+USER_KEYSET = Keyset(
+    pk=("UserID", "UserID"),
+    sorts={"username": ("Username", "Username")},
+    filters={"role": ("Role", "=")}
+)
+
+# ── Session User Cache ──
+# Flask-Login reloads the user on every authenticated request; keep recent
+# User objects in memory and drop them whenever the row changes.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60"))
+)
+
+def load_session_user(uid):
+    key = str(uid)
+    user = user_cache.get(key)
+    if user is None:
+        user = get_user_by_id(uid)
+        if user is not None:
+            user_cache.set(key, user)
+    return user
+
+def forget_session_user(uid):
+    user_cache.invalidate(lambda key: key == str(uid))
+
+def get_all_users(page=None):
     db = get_db(); cur = db.cursor(dictionary=True)
+    if page is not None:
+        return fetch_page(cur, "SELECT * FROM `User`", page)
     cur.execute("SELECT * FROM `User`")
     return cur.fetchall()
 
@@ -58,6 +361,14 @@ def update_user(uid, username, role):
       (username, role, uid)
     )
     db.commit()
+    forget_session_user(uid)
+
+def update_user_password(uid, raw_password):
+    pw_hash = passwords.hash_password(raw_password)
+    db = get_db(); cur = db.cursor()
+    cur.execute("UPDATE `User` SET PasswordHash=%s WHERE UserID=%s", (pw_hash, uid))
+    db.commit()
+    forget_session_user(uid)
 
 def delete_user(uid):
     db = get_db(); cur = db.cursor(dictionary=True)
@@ -76,13 +387,16 @@ def delete_user(uid):
     cur = db.cursor()
     cur.execute("DELETE FROM `User` WHERE UserID=%s", (uid,))
     db.commit()
+    forget_session_user(uid)
     
 # ── MembershipPlan ──
+@cached("MembershipPlan")
 def get_all_plans():
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM MembershipPlan")
     return cur.fetchall()
 
+@invalidates("MembershipPlan")
 def create_plan(planName, monthlyFee, accessLevel=None):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -92,18 +406,272 @@ def create_plan(planName, monthlyFee, accessLevel=None):
     db.commit()
 
 # ── Member ──
-def get_all_members():
+MEMBER_KEYSET = Keyset(
+    pk=("m.MemberID", "MemberID"),
+    sorts={
+        "name": ("m.LastName", "LastName"),
+        "email": ("m.Email", "Email")
+    },
+    filters={
+        "status": ("m.MembershipStatus", "="),
+        "plan": ("m.CurrentPlanID", "="),
+        "joined_from": ("m.MembershipStartDate", ">="),
+        "joined_to": ("m.MembershipStartDate", "<=")
+    }
+)
+
+MEMBER_LIST_SQL = """
+    SELECT 
+        m.MemberID, m.FirstName, m.LastName, m.Email,
+        m.MembershipStartDate,
+        m.MembershipStatus,
+        p.PlanName
+    FROM Member m
+    LEFT JOIN MembershipPlan p ON m.CurrentPlanID = p.PlanID
+"""
+
+# ── Member Lookup Index ──
+# Check-in kiosks resolve members by ID, phone or email many times a minute,
+# and the front desk searches them by name as they type. A compact copy of
+# the lookup columns lives in memory: single-row writes patch it in place,
+# bulk writes trigger a reload, and the TTL bounds how far it can drift
+# from writes made by other worker processes.
+MEMBER_INDEX_TTL = float(os.getenv("MEMBER_INDEX_TTL", "300"))
+SEARCH_SCAN_LIMIT = 2000
+MEMBER_INDEX_SQL = """
+    SELECT MemberID, FirstName, LastName, Email, PhoneNumber,
+           CurrentPlanID, MembershipStatus
+    FROM Member
+"""
+
+def phone_key(phone):
+    digits = "".join(c for c in str(phone or "") if c.isdigit())
+    return digits or None
+
+# Search keys per member with their weight; the full name lets "jo sm" match
+# as typed, the separate names let either one be typed first
+def search_keys(row):
+    first = (row["FirstName"] or "").strip().lower()
+    last = (row["LastName"] or "").strip().lower()
+    keys = [(first, 3), (last, 3), (f"{first} {last}", 4), ((row["Email"] or "").lower(), 2)]
+    phone = phone_key(row["PhoneNumber"])
+    if phone:
+        keys.append((phone, 2))
+    return [(key, weight, row["MemberID"]) for key, weight in keys if key]
+
+class MemberIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self._by_id = {}
+        self._by_email = {}
+        self._by_phone = {}
+        self._prefixes = []     # sorted (key, weight, MemberID)
+        self._loaded_at = None
+        self._generation = None
+        self._changed = None    # MemberID -> row or None, patched in while a load runs
+
+    def _stale(self):
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > MEMBER_INDEX_TTL
+            or self._generation != _generations.get("Member", 0)
+        )
+
+    def _load(self):
+        generation = _generations.get("Member", 0)
+        with self._lock:
+            self._changed = {}
+        try:
+            db = get_db(); cur = db.cursor(dictionary=True)
+            cur.execute(MEMBER_INDEX_SQL)
+            by_id, by_email, by_phone, prefixes = {}, {}, {}, []
+            for row in cur.fetchall():
+                by_id[row["MemberID"]] = row
+                by_email[row["Email"].lower()] = row
+                phone = phone_key(row["PhoneNumber"])
+                if phone:
+                    by_phone[phone] = row
+                prefixes.extend(search_keys(row))
+            prefixes.sort()
+        except Exception:
+            with self._lock:
+                self._changed = None
+            raise
+        with self._lock:
+            self._by_id, self._by_email, self._by_phone = by_id, by_email, by_phone
+            self._prefixes = prefixes
+            self._loaded_at = time.monotonic()
+            self._generation = generation
+            # The query may have read a row before a write patched the old copy
+            changed, self._changed = self._changed, None
+            for mid, row in changed.items():
+                self._drop(mid)
+                if row is not None:
+                    self._insert(row)
+
+    def _put(self, row):
+        with self._lock:
+            self._drop(row["MemberID"])
+            self._insert(row)
+            if self._changed is not None:
+                self._changed[row["MemberID"]] = row
+
+    def _insert(self, row):
+        self._by_id[row["MemberID"]] = row
+        self._by_email[row["Email"].lower()] = row
+        phone = phone_key(row["PhoneNumber"])
+        if phone:
+            self._by_phone[phone] = row
+        for entry in search_keys(row):
+            bisect.insort(self._prefixes, entry)
+
+    def _drop(self, mid):
+        old = self._by_id.pop(mid, None)
+        if old is not None:
+            self._by_email.pop(old["Email"].lower(), None)
+            self._by_phone.pop(phone_key(old["PhoneNumber"]), None)
+            for entry in search_keys(old):
+                i = bisect.bisect_left(self._prefixes, entry)
+                if i < len(self._prefixes) and self._prefixes[i] == entry:
+                    del self._prefixes[i]
+
+    def _fetch(self, where, value):
+        db = get_db(); cur = db.cursor(dictionary=True)
+        cur.execute(f"{MEMBER_INDEX_SQL} WHERE {where} LIMIT 1", (value,))
+        return cur.fetchone()
+
+    def _ensure_loaded(self):
+        """Rebuild a stale index once, however many requests notice it.
+
+        Before the first load every caller waits for it; afterwards one
+        request rebuilds while the others keep answering from the old copy,
+        whose misses still fall back to the database.
+        """
+        if not self._stale():
+            return
+        if self._loaded_at is None:
+            with self._loading:
+                if self._loaded_at is None:
+                    self._load()
+        elif self._loading.acquire(blocking=False):
+            try:
+                if self._stale():
+                    self._load()
+            finally:
+                self._loading.release()
+
+    def lookup(self, member_id=None, email=None, phone=None):
+        """Resolve a member from whichever key is given; misses fall back to the database"""
+        self._ensure_loaded()
+
+        if member_id is not None:
+            key, table, where = int(member_id), self._by_id, "MemberID = %s"
+        elif email:
+            key, table, where = email.strip().lower(), self._by_email, "Email = %s"
+        elif phone_key(phone):
+            # PhoneDigits holds the number as digits only, like the index keys
+            key, table, where = phone_key(phone), self._by_phone, "PhoneDigits = %s"
+        else:
+            return None
+
+        row = table.get(key)
+        if row is None:
+            # Joined since the last load, possibly through another worker
+            row = self._fetch(where, key)
+            if row is not None:
+                self._put(row)
+        return row
+
+    def _range(self, term):
+        """Slice of the sorted keys starting with term (lock held)"""
+        start = bisect.bisect_left(self._prefixes, (term,))
+        return start, bisect.bisect_left(self._prefixes, (term + "\uffff",), start)
+
+    def search(self, query, limit=10):
+        """Members matching every word of query as a prefix, best first.
+
+        Case-insensitive over first name, last name, "first last", email
+        and phone digits; a query of digits and phone punctuation searches
+        phone numbers only. Candidates come from the word with the fewest
+        matching keys; one- or two-letter prefixes that match most of the
+        table rank only the first SEARCH_SCAN_LIMIT keys in order.
+        """
+        self._ensure_loaded()
+        query = " ".join((query or "").lower().split())
+        if all(c.isdigit() or c in " +-()." for c in query):
+            query = phone_key(query) or ""
+        if not query:
+            return []
+        terms = query.split()
+
+        with self._lock:
+            ranges = [(self._range(t), t) for t in terms]
+            (start, stop), narrowest = min(ranges, key=lambda r: r[0][1] - r[0][0])
+            scores = {}
+            for key, weight, mid in self._prefixes[start:min(stop, start + SEARCH_SCAN_LIMIT)]:
+                # A whole-key match outranks a prefix of a longer one
+                score = weight + 1 if key == narrowest else weight
+                if score > scores.get(mid, 0):
+                    scores[mid] = score
+            rows = [self._by_id[mid] for mid in scores if mid in self._by_id]
+
+        others = [t for t in terms if t != narrowest]
+        results = []
+        for row in rows:
+            score = scores[row["MemberID"]]
+            if others:
+                keys = search_keys(row)
+                for term in others:
+                    best = max((w + 1 if k == term else w for k, w, _ in keys if k.startswith(term)), default=0)
+                    if not best:
+                        break
+                    score += best
+                else:
+                    # The whole query running along the full name ("jane sm") ranks highest
+                    if any(k.startswith(query) for k, _, _ in keys):
+                        score *= 2
+                    results.append((score, row))
+            else:
+                results.append((score, row))
+
+        best = heapq.nsmallest(limit, results, key=lambda r: (
+            -r[0], (r[1]["LastName"] or "").lower(), (r[1]["FirstName"] or "").lower(), r[1]["MemberID"]
+        ))
+        return [row for _, row in best]
+
+    def refresh(self, mid):
+        if self._loaded_at is None and self._changed is None:
+            return
+        row = self._fetch("MemberID = %s", mid)
+        if row is None:
+            self.remove(mid)
+        else:
+            self._put(row)
+
+    def remove(self, mid):
+        with self._lock:
+            self._drop(int(mid))
+            if self._changed is not None:
+                self._changed[int(mid)] = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "members": len(self._by_id),
+                "phones": len(self._by_phone),
+                "search_keys": len(self._prefixes),
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None
+            }
+
+member_index = MemberIndex()
+
+def get_all_members(page=None):
     db = get_db()
     cur = db.cursor(dictionary=True)
-    cur.execute("""
-        SELECT 
-            m.MemberID, m.FirstName, m.LastName, m.Email,
-            m.MembershipStartDate,
-            m.MembershipStatus,
-            p.PlanName
-        FROM Member m
-        LEFT JOIN MembershipPlan p ON m.CurrentPlanID = p.PlanID
-    """)
+    if page is not None:
+        return fetch_page(cur, MEMBER_LIST_SQL, page)
+    cur.execute(MEMBER_LIST_SQL)
     return cur.fetchall()
 
 def get_member_by_id(mid):
@@ -111,6 +679,7 @@ def get_member_by_id(mid):
     cur.execute("SELECT * FROM Member WHERE MemberID=%s", (mid,))
     return cur.fetchone()
 
+@touches("Member")
 def create_member(
     firstName, lastName, email,
     DateOfBirth=None, PhoneNumber=None,
@@ -134,7 +703,9 @@ def create_member(
       )
     )
     db.commit()
+    member_index.refresh(cur.lastrowid)
 
+@touches("Member")
 def update_member(
     mid, firstName, lastName, email,
     DateOfBirth=None, PhoneNumber=None,
@@ -158,11 +729,20 @@ def update_member(
       )
     )
     db.commit()
+    member_index.refresh(mid)
 
+@touches("Member")
 def delete_member(mid):
     db = get_db(); cur = db.cursor()
-    cur.execute("DELETE FROM Member WHERE MemberID=%s", (mid,))
-    db.commit()
+    try:
+        # Their attendance goes with them by cascade
+        apply_rollups(cur, attendance_changes(cur, "a.MemberID = %s", (mid,), -1))
+        cur.execute("DELETE FROM Member WHERE MemberID=%s", (mid,))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    member_index.remove(mid)
 
 # ── MembershipHistory ──
 def get_all_history():
@@ -170,6 +750,7 @@ def get_all_history():
     cur.execute("SELECT * FROM MembershipHistory")
     return cur.fetchall()
 
+@invalidates("MembershipHistory")
 def create_membership_history(MemberID, PlanID, StartDate, EndDate=None):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -179,16 +760,27 @@ def create_membership_history(MemberID, PlanID, StartDate, EndDate=None):
     db.commit()
 
 # ── Trainer ──
-def get_all_trainers():
+TRAINER_KEYSET = Keyset(
+    pk=("TrainerID", "TrainerID"),
+    sorts={"name": ("LastName", "LastName")},
+    filters={"specialty": ("Specialty", "=")}
+)
+
+@cached("Trainer")
+def get_all_trainers(page=None):
     db = get_db(); cur = db.cursor(dictionary=True)
+    if page is not None:
+        return fetch_page(cur, "SELECT * FROM Trainer", page)
     cur.execute("SELECT * FROM Trainer")
     return cur.fetchall()
 
+@cached("Trainer")
 def get_trainer_by_id(tid):
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM Trainer WHERE TrainerID=%s", (tid,))
     return cur.fetchone()
 
+@invalidates("Trainer")
 def create_trainer(FirstName, LastName, Email, Specialty=None):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -197,6 +789,7 @@ def create_trainer(FirstName, LastName, Email, Specialty=None):
     )
     db.commit()
 
+@invalidates("Trainer")
 def update_trainer(tid, FirstName, LastName, Specialty):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -205,22 +798,26 @@ def update_trainer(tid, FirstName, LastName, Specialty):
     )
     db.commit()
 
+@invalidates("Trainer")
 def delete_trainer(tid):
     db = get_db(); cur = db.cursor()
     cur.execute("DELETE FROM Trainer WHERE TrainerID=%s", (tid,))
     db.commit()
 
 # ── Room ──
+@cached("Room")
 def get_all_rooms():
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM Room")
     return cur.fetchall()
 
+@cached("Room")
 def get_room_by_id(rid):
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM Room WHERE RoomID=%s", (rid,))
     return cur.fetchone()
 
+@invalidates("Room")
 def create_room(RoomName, Capacity):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -229,6 +826,7 @@ def create_room(RoomName, Capacity):
     )
     db.commit()
 
+@invalidates("Room")
 def update_room(rid, RoomName, Capacity):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -237,6 +835,7 @@ def update_room(rid, RoomName, Capacity):
     )
     db.commit()
 
+@invalidates("Room")
 def delete_room(rid):
     db = get_db()
     cur = db.cursor()
@@ -258,6 +857,7 @@ def get_all_classes():
     cur.execute("SELECT * FROM FitnessClass")
     return cur.fetchall()
 
+@invalidates("FitnessClass")
 def create_fitness_class(ClassName, Capacity, RoomID, TrainerID, ClassDescription=None):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -277,6 +877,7 @@ def get_all_schedules():
     cur.execute("SELECT * FROM ClassSchedule")
     return cur.fetchall()
 
+@invalidates("ClassSchedule")
 def create_class_schedule(ClassID, ScheduleDate, StartTime, EndTime):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -305,6 +906,40 @@ def get_all_payments():
     cur.execute("SELECT * FROM Payments")
     return cur.fetchall()
 
+def get_payment_facts():
+    """Raw payment columns for the revenue reports, as tuples"""
+    db = get_db(); cur = db.cursor()
+    cur.execute("""
+        SELECT MemberID, Amount, PaymentDate, PaymentMethod, PaymentStatus
+        FROM Payments
+    """)
+    return cur.fetchall()
+
+def get_plan_periods():
+    """(MemberID, PlanID, StartDate, EndDate) ordered for per-member binary search"""
+    db = get_db(); cur = db.cursor()
+    cur.execute("""
+        SELECT MemberID, PlanID, StartDate, EndDate
+        FROM MembershipHistory
+        ORDER BY MemberID, StartDate, HistoryID
+    """)
+    return cur.fetchall()
+
+def get_current_plans():
+    db = get_db(); cur = db.cursor()
+    cur.execute("SELECT MemberID, CurrentPlanID FROM Member ORDER BY MemberID")
+    return cur.fetchall()
+
+# A payment counts as revenue unless it is still pending. The dashboard
+# and revenue.py both go through these so their totals agree.
+PENDING_PAYMENT = "pending"
+COLLECTED_PAYMENT_SQL = f"(PaymentStatus IS NULL OR PaymentStatus <> '{PENDING_PAYMENT}')"
+
+def payment_pending(status):
+    """COLLECTED_PAYMENT_SQL's test in Python, with MySQL's case and trailing-space rules"""
+    return (status or "").rstrip().lower() == PENDING_PAYMENT
+
+@invalidates("Payments")
 def create_payment(MemberID, Amount, PaymentDate, PaymentMethod=None, PaymentStatus=None):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -318,12 +953,107 @@ def create_payment(MemberID, Amount, PaymentDate, PaymentMethod=None, PaymentSta
     )
     db.commit()
 
+# ── Billing ──
+BILLING_STATUS = "Pending"
+
+def get_billing_runs(limit=12):
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("SELECT * FROM BillingRun ORDER BY BillingMonth DESC LIMIT %s", (limit,))
+    return cur.fetchall()
+
+def start_billing_run(month):
+    """Open or resume the run for `month`; returns the MemberID to continue after.
+
+    A finished run is reopened from the start, which bills members who
+    became active since without touching anyone already billed.
+    """
+    db = get_db(); cur = db.cursor()
+    begin(db)
+    try:
+        cur.execute("SELECT Status, LastMemberID FROM BillingRun WHERE BillingMonth = %s FOR UPDATE", (month,))
+        row = cur.fetchone()
+        if row is None:
+            cur.execute("INSERT INTO BillingRun (BillingMonth, Status) VALUES (%s, 'running')", (month,))
+            after = 0
+        elif row[0] == "done":
+            cur.execute("""
+                UPDATE BillingRun SET Status = 'running', LastMemberID = 0, FinishedAt = NULL
+                WHERE BillingMonth = %s
+            """, (month,))
+            after = 0
+        else:
+            after = row[1]
+        db.commit()
+        return after
+    except Exception:
+        db.rollback()
+        raise
+
+def bill_members(month, after, limit, payment_date):
+    """Invoice the next `limit` members past `after` and checkpoint, in one transaction.
+
+    Returns (last MemberID covered or None when finished, invoices created).
+    The unique (MemberID, BillingMonth) key makes repeats no-ops.
+    """
+    db = get_db(); cur = db.cursor()
+    begin(db)
+    try:
+        cur.execute("""
+            SELECT MAX(MemberID), COUNT(*) FROM (
+                SELECT MemberID FROM Member WHERE MemberID > %s ORDER BY MemberID LIMIT %s
+            ) batch
+        """, (after, limit))
+        upper, scanned = cur.fetchone()
+        if not scanned:
+            cur.execute("""
+                UPDATE BillingRun SET Status = 'done', FinishedAt = NOW()
+                WHERE BillingMonth = %s
+            """, (month,))
+            db.commit()
+            return None, 0
+
+        cur.execute("""
+            INSERT INTO Payments (MemberID, Amount, PaymentDate, PaymentMethod, PaymentStatus, BillingMonth)
+            SELECT m.MemberID, p.MonthlyFee, %s, NULL, %s, %s
+            FROM Member m
+            JOIN MembershipPlan p ON m.CurrentPlanID = p.PlanID
+            WHERE m.MemberID > %s AND m.MemberID <= %s
+              AND m.MembershipStatus = 'active'
+            ON DUPLICATE KEY UPDATE PaymentID = PaymentID
+        """, (payment_date, BILLING_STATUS, month, after, upper))
+        created = cur.rowcount
+        # A short batch reached the end of the table, so it also closes the run
+        finished = scanned < limit
+        cur.execute("""
+            UPDATE BillingRun
+            SET LastMemberID = %s, Created = Created + %s,
+                Status = IF(%s, 'done', Status), FinishedAt = IF(%s, NOW(), FinishedAt)
+            WHERE BillingMonth = %s
+        """, (upper, created, finished, finished, month))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return (None if finished else upper), created
+
 # ── Equipment ──
-def get_all_equipment():
+EQUIPMENT_KEYSET = Keyset(
+    pk=("EquipmentID", "EquipmentID"),
+    sorts={"name": ("EquipmentName", "EquipmentName")},
+    filters={
+        "room": ("RoomID", "="),
+        "condition": ("`Condition`", "=")
+    }
+)
+
+def get_all_equipment(page=None):
     db = get_db(); cur = db.cursor(dictionary=True)
+    if page is not None:
+        return fetch_page(cur, "SELECT * FROM Equipment", page)
     cur.execute("SELECT * FROM Equipment")
     return cur.fetchall()
 
+@touches("Equipment")
 def create_equipment(EquipmentName, PurchaseDate=None, Condition=None, RoomID=None):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -333,11 +1063,13 @@ def create_equipment(EquipmentName, PurchaseDate=None, Condition=None, RoomID=No
     db.commit()
 
 # ── Staff ──
+@cached("Staff")
 def get_staff_by_id(sid):
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM Staff WHERE StaffID=%s", (sid,))
     return cur.fetchone()
 
+@invalidates("Staff")
 def update_staff(sid, FirstName, LastName, Email, Role):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -346,6 +1078,7 @@ def update_staff(sid, FirstName, LastName, Email, Role):
     )
     db.commit()
 
+@invalidates("Staff")
 def delete_staff(sid):
     db = get_db(); cur = db.cursor()
     cur.execute("DELETE FROM Staff WHERE StaffID=%s", (sid,))
@@ -371,8 +1104,21 @@ def create_equipment_maintenance(EquipmentID, StaffID, MaintenanceDate, Maintena
     db.commit()
 
     # ── MaintenanceLog ──
-def get_all_maintenance_logs():
+MAINTENANCE_LOG_KEYSET = Keyset(
+    pk=("LogID", "LogID"),
+    sorts={"reported": ("ReportDate", "ReportDate")},
+    filters={
+        "status": ("ResolutionStatus", "="),
+        "equipment": ("EquipmentID", "="),
+        "from": ("ReportDate", ">="),
+        "to": ("ReportDate", "<=")
+    }
+)
+
+def get_all_maintenance_logs(page=None):
     db = get_db(); cur = db.cursor(dictionary=True)
+    if page is not None:
+        return fetch_page(cur, "SELECT * FROM MaintenanceLog", page)
     cur.execute("SELECT * FROM MaintenanceLog")
     return cur.fetchall()
 
@@ -408,11 +1154,40 @@ def get_all_events():
     cur.execute("SELECT * FROM CalendarEvent")
     return cur.fetchall()
 
+def get_longest_event_seconds():
+    """Duration of the longest event, which bounds how early an overlapping event can start.
+
+    Read fresh every time (through idx_event_duration) rather than cached,
+    so an event another worker just added can't fall outside the bound.
+    """
+    db = get_db(); cur = db.cursor()
+    cur.execute("SELECT COALESCE(MAX(DurationSeconds), 0) FROM CalendarEvent")
+    return int(cur.fetchone()[0])
+
+def get_events_in_range(start, end):
+    """Events overlapping [start, end), found through idx_event_range.
+
+    The StartTime lower bound (no event starts earlier than `start` minus the
+    longest duration and still overlaps) turns the index lookup into a
+    closed range instead of a scan of every earlier event.
+    """
+    longest = get_longest_event_seconds()
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT EventID, Title, Description, StartTime, EndTime, Location, CreatedBy, EventType
+        FROM CalendarEvent
+        WHERE StartTime >= %s - INTERVAL %s SECOND
+          AND StartTime < %s AND EndTime > %s
+        ORDER BY StartTime
+    """, (start, longest, end, start))
+    return cur.fetchall()
+
 def get_event_by_id(event_id):
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM CalendarEvent WHERE EventID = %s", (event_id,))
     return cur.fetchone()
 
+@invalidates("CalendarEvent")
 def create_calendar_event(Title, StartTime, EndTime, CreatedBy, Description=None, Location=None, EventType='other'):
     db = get_db(); cur = db.cursor()
     cur.execute("""
@@ -423,16 +1198,19 @@ def create_calendar_event(Title, StartTime, EndTime, CreatedBy, Description=None
     """, (Title, Description, StartTime, EndTime, Location, CreatedBy, EventType))
     db.commit()
 
+@invalidates("CalendarEvent")
 def delete_event(event_id):
     db = get_db(); cur = db.cursor()
     cur.execute("DELETE FROM CalendarEvent WHERE EventID = %s", (event_id,))
     db.commit()
 
+@cached("Staff")
 def get_all_staff():
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM Staff")
     return cur.fetchall()
 
+@invalidates("Staff")
 def create_staff(FirstName, LastName, Email, Role):
     db = get_db(); cur = db.cursor()
     cur.execute(
@@ -441,6 +1219,7 @@ def create_staff(FirstName, LastName, Email, Role):
     )
     db.commit()
 
+@touches("Equipment")
 def update_equipment(eid, EquipmentName, PurchaseDate, Condition, RoomID):
     db = get_db()
     cur = db.cursor()
@@ -450,6 +1229,7 @@ def update_equipment(eid, EquipmentName, PurchaseDate, Condition, RoomID):
     )
     db.commit()
 
+@touches("Equipment")
 def delete_equipment(eid):
     db = get_db()
     cur = db.cursor()
@@ -477,42 +1257,485 @@ def get_class_by_id(cid):
     cur.execute("SELECT * FROM FitnessClass WHERE ClassID=%s", (cid,))
     return cur.fetchone()
 
+# Sessions are cached with their class's room (get_room_sessions), and a
+# class delete cascades into ClassSchedule, so both tables are dropped
+@invalidates("FitnessClass")
+@invalidates("ClassSchedule")
 def update_fitness_class(cid, name, desc, capacity, room_id, trainer_id):
     db = get_db(); cur = db.cursor()
-    cur.execute("""
-        UPDATE FitnessClass
-        SET ClassName=%s, ClassDescription=%s, Capacity=%s,
-            RoomID=%s, TrainerID=%s
-        WHERE ClassID=%s
-    """, (name, desc, capacity, room_id, trainer_id, cid))
-    db.commit()
+    try:
+        cur.execute("SELECT RoomID FROM FitnessClass WHERE ClassID=%s FOR UPDATE", (cid,))
+        row = cur.fetchone()
+        moved = []
+        if row is not None and str(row[0]) != str(room_id):
+            # Room occupancy follows the class to its new room
+            moved = attendance_changes(cur, "s.ClassID = %s", (cid,), -1)
+            apply_rollups(cur, moved)
+        cur.execute("""
+            UPDATE FitnessClass
+            SET ClassName=%s, ClassDescription=%s, Capacity=%s,
+                RoomID=%s, TrainerID=%s
+            WHERE ClassID=%s
+        """, (name, desc, capacity, room_id, trainer_id, cid))
+        apply_rollups(cur, reverse_changes(moved))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
+@invalidates("FitnessClass")
+@invalidates("ClassSchedule")
 def delete_fitness_class(cid):
     db = get_db(); cur = db.cursor()
-    cur.execute("DELETE FROM FitnessClass WHERE ClassID=%s", (cid,))
-    db.commit()
+    try:
+        apply_rollups(cur, attendance_changes(cur, "s.ClassID = %s", (cid,), -1))
+        cur.execute("DELETE FROM FitnessClass WHERE ClassID=%s", (cid,))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
 def get_schedule_by_id(sid):
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM ClassSchedule WHERE ScheduleID = %s", (sid,))
     return cur.fetchone()
 
+@invalidates("ClassSchedule")
 def update_class_schedule(sid, class_id, date, start, end):
     db = get_db(); cur = db.cursor()
-    cur.execute("""
-        UPDATE ClassSchedule
-        SET ClassID = %s, ScheduleDate = %s, StartTime = %s, EndTime = %s
-        WHERE ScheduleID = %s
-    """, (class_id, date, start, end, sid))
-    db.commit()
+    try:
+        # Take the session's attendance out of the rollups at its old slot
+        # and add it back at the new one
+        moved = attendance_changes(cur, "s.ScheduleID = %s", (sid,), -1)
+        apply_rollups(cur, moved)
+        cur.execute("""
+            UPDATE ClassSchedule
+            SET ClassID = %s, ScheduleDate = %s, StartTime = %s, EndTime = %s
+            WHERE ScheduleID = %s
+        """, (class_id, date, start, end, sid))
+        apply_rollups(cur, reverse_changes(moved))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
+@invalidates("ClassSchedule")
 def delete_schedule(schedule_id):
     conn = get_db()
     cur = conn.cursor()
-    cur.execute("DELETE FROM ClassSchedule WHERE ScheduleID = %s", (schedule_id,))
-    conn.commit()
+    try:
+        apply_rollups(cur, attendance_changes(cur, "s.ScheduleID = %s", (schedule_id,), -1))
+        cur.execute("DELETE FROM ClassSchedule WHERE ScheduleID = %s", (schedule_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     cur.close()
 
+# ── Check-ins ──
+@cached("ClassSchedule")
+def get_room_sessions(room_id, day):
+    """A room's sessions on one day; kiosks ask for this on every check-in"""
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT s.ScheduleID, s.StartTime, s.EndTime, c.ClassID, c.ClassName
+        FROM ClassSchedule s
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        WHERE s.ScheduleDate = %s AND c.RoomID = %s
+        ORDER BY s.StartTime
+    """, (day, room_id))
+    return cur.fetchall()
+
+def record_checkin(member_id, room_id=None, schedule_id=None):
+    """Log a visit and mark the member present in the running session.
+
+    The member's status and plan are re-checked in the INSERT itself, so an
+    index entry that is a few seconds stale can never let a lapsed member in.
+    Returns False when that check fails.
+    """
+    db = get_db(); cur = db.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO CheckIn (MemberID, RoomID, ScheduleID)
+            SELECT MemberID, %s, %s FROM Member
+            WHERE MemberID = %s AND MembershipStatus = 'active' AND CurrentPlanID IS NOT NULL
+        """, (room_id, schedule_id, member_id))
+        if cur.rowcount == 0:
+            db.rollback()
+            return False
+        if schedule_id is not None:
+            previous = existing_statuses(cur, [(member_id, schedule_id)])
+            # Walk-ins are recorded too: they are in the room either way
+            cur.execute("""
+                INSERT INTO Attendance (MemberID, ScheduleID, Status)
+                VALUES (%s, %s, 'present')
+                ON DUPLICATE KEY UPDATE Status = 'present'
+            """, (member_id, schedule_id))
+            changes = [(schedule_id, member_id, "present", 1)]
+            if (member_id, schedule_id) in previous:
+                changes.append((schedule_id, member_id, previous[(member_id, schedule_id)], -1))
+            apply_rollups(cur, changes)
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+
+def write_checkins(checkins, attendance, batch_size=BULK_BATCH_SIZE):
+    """Write buffered check-ins and attendance marks in one transaction.
+
+    checkins are (MemberID, RoomID, ScheduleID, CheckInTime) tuples and
+    attendance holds (MemberID, ScheduleID, Status) upserts. Admission was
+    decided from the member index, which can lag the database (e.g. behind a
+    reconcile run in another process), so membership is checked again here
+    the way record_checkin does. Returns the events dropped by that check.
+    """
+    db = get_db(); cur = db.cursor()
+    try:
+        members = sorted({c[0] for c in checkins} | {a[0] for a in attendance})
+        admitted = set()
+        for start in range(0, len(members), batch_size):
+            chunk = members[start:start + batch_size]
+            cur.execute(f"""
+                SELECT MemberID FROM Member
+                WHERE MemberID IN ({', '.join(['%s'] * len(chunk))})
+                  AND MembershipStatus = 'active' AND CurrentPlanID IS NOT NULL
+            """, chunk)
+            admitted.update(r[0] for r in cur.fetchall())
+        rejected = [c for c in checkins if c[0] not in admitted] + [a for a in attendance if a[0] not in admitted]
+        checkins = [c for c in checkins if c[0] in admitted]
+        attendance = [a for a in attendance if a[0] in admitted]
+
+        for start in range(0, len(checkins), batch_size):
+            cur.executemany("""
+                INSERT INTO CheckIn (MemberID, RoomID, ScheduleID, CheckInTime)
+                VALUES (%s, %s, %s, %s)
+            """, checkins[start:start + batch_size])
+        previous = existing_statuses(cur, [(m, sid) for m, sid, _ in attendance])
+        for start in range(0, len(attendance), batch_size):
+            cur.executemany("""
+                INSERT INTO Attendance (MemberID, ScheduleID, Status)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE Status = VALUES(Status)
+            """, attendance[start:start + batch_size])
+        changes = []
+        for member_id, schedule_id, status in attendance:
+            changes.append((schedule_id, member_id, status, 1))
+            if (member_id, schedule_id) in previous:
+                changes.append((schedule_id, member_id, previous[(member_id, schedule_id)], -1))
+        apply_rollups(cur, changes)
+        db.commit()
+        return rejected
+    except Exception:
+        db.rollback()
+        raise
+
+# ── Membership Reconciliation ──
+# MembershipStatus and CurrentPlanID are edited by hand and drift from the
+# history periods. These statuses are set deliberately and never overridden.
+MANUAL_STATUSES = ("suspended", "cancelled")
+RECONCILE_SQL = """
+    SELECT m.MemberID, m.MembershipStatus, m.CurrentPlanID,
+           (SELECT h.PlanID FROM MembershipHistory h
+            WHERE h.MemberID = m.MemberID AND h.StartDate <= %s
+              AND (h.EndDate IS NULL OR h.EndDate >= %s)
+            ORDER BY h.StartDate DESC, h.HistoryID DESC
+            LIMIT 1) AS OpenPlanID,
+           EXISTS (SELECT 1 FROM MembershipHistory h
+                   WHERE h.MemberID = m.MemberID AND h.StartDate <= %s) AS Started
+    FROM Member m
+    WHERE m.MemberID > %s
+    ORDER BY m.MemberID
+    LIMIT %s
+    FOR UPDATE OF m
+"""
+
+def membership_corrections(row):
+    """(field, old, new) changes that bring one member in line with their history"""
+    member_id, status, plan_id, open_plan, started = row
+    current = (status or "").lower()
+    changes = []
+    if open_plan is not None:
+        if current not in MANUAL_STATUSES and current != "active":
+            changes.append(("MembershipStatus", status, "active"))
+        if plan_id != open_plan:
+            changes.append(("CurrentPlanID", plan_id, open_plan))
+    elif started and current == "active":
+        # Every period has ended; the last plan stays on record
+        changes.append(("MembershipStatus", status, "inactive"))
+    return changes
+
+@touches("Member")
+def reconcile_members(after, limit, today):
+    """Correct one batch of members past MemberID `after`.
+
+    The batch's Member rows are locked only for this short transaction.
+    Returns the last MemberID examined (None when done) and the changes made
+    as (MemberID, field, old, new).
+    """
+    db = get_db(); cur = db.cursor()
+    begin(db)
+    try:
+        cur.execute(RECONCILE_SQL, (today, today, today, after, limit))
+        rows = cur.fetchall()
+        changes = [(row[0], *c) for row in rows for c in membership_corrections(row)]
+
+        status = [(new, mid) for mid, field, _, new in changes if field == "MembershipStatus"]
+        plans = [(new, mid) for mid, field, _, new in changes if field == "CurrentPlanID"]
+        if status:
+            cur.executemany("UPDATE Member SET MembershipStatus = %s WHERE MemberID = %s", status)
+        if plans:
+            cur.executemany("UPDATE Member SET CurrentPlanID = %s WHERE MemberID = %s", plans)
+        if changes:
+            cur.executemany("""
+                INSERT INTO MembershipChange (MemberID, Field, OldValue, NewValue, Source)
+                VALUES (%s, %s, %s, %s, 'reconcile')
+            """, [(mid, field, old, new) for mid, field, old, new in changes])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    last = rows[-1][0] if len(rows) == limit else None
+    return last, changes
+
+def get_membership_changes(mid=None, limit=100):
+    db = get_db(); cur = db.cursor(dictionary=True)
+    where = "WHERE c.MemberID = %s" if mid else ""
+    cur.execute(f"""
+        SELECT c.ChangeID, c.MemberID, m.FirstName, m.LastName,
+               c.Field, c.OldValue, c.NewValue, c.Source, c.ChangedAt
+        FROM MembershipChange c
+        JOIN Member m ON c.MemberID = m.MemberID
+        {where}
+        ORDER BY c.ChangeID DESC
+        LIMIT %s
+    """, ((mid, limit) if mid else (limit,)))
+    return cur.fetchall()
+
+# ── ClassRecurrence ──
+def get_all_recurrences():
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT r.*, c.ClassName
+        FROM ClassRecurrence r
+        JOIN FitnessClass c ON r.ClassID = c.ClassID
+        ORDER BY c.ClassName, r.StartTime
+    """)
+    return cur.fetchall()
+
+def get_recurrences_due(through):
+    """Rules that still have sessions to generate up to the given date"""
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT * FROM ClassRecurrence
+        WHERE (GeneratedThrough IS NULL OR GeneratedThrough < %s)
+          AND (EndDate IS NULL OR GeneratedThrough IS NULL OR GeneratedThrough < EndDate)
+    """, (through,))
+    return cur.fetchall()
+
+def create_recurrence(ClassID, Weekdays, StartTime, EndTime, StartDate, EndDate=None):
+    db = get_db(); cur = db.cursor()
+    cur.execute("""
+        INSERT INTO ClassRecurrence (ClassID, Weekdays, StartTime, EndTime, StartDate, EndDate)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (ClassID, Weekdays, StartTime, EndTime, StartDate, EndDate))
+    db.commit()
+    return cur.lastrowid
+
+@invalidates("ClassSchedule")
+def delete_recurrence(recurrence_id):
+    """Drop a rule and its upcoming sessions; past sessions stay as one-offs"""
+    db = get_db(); cur = db.cursor()
+    upcoming = (recurrence_id, date.today())
+    try:
+        apply_rollups(cur, attendance_changes(cur, "s.RecurrenceID = %s AND s.ScheduleDate >= %s", upcoming, -1))
+        cur.execute("DELETE FROM ClassSchedule WHERE RecurrenceID = %s AND ScheduleDate >= %s", upcoming)
+        removed = cur.rowcount
+        cur.execute("DELETE FROM ClassRecurrence WHERE RecurrenceID = %s", (recurrence_id,))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return removed
+
+def get_generated_dates(recurrence_ids, start_date, end_date):
+    """(RecurrenceID, ScheduleDate) pairs already materialized in a window"""
+    if not recurrence_ids:
+        return set()
+    db = get_db(); cur = db.cursor()
+    cur.execute(f"""
+        SELECT RecurrenceID, ScheduleDate FROM ClassSchedule
+        WHERE RecurrenceID IN ({', '.join(['%s'] * len(recurrence_ids))})
+          AND ScheduleDate BETWEEN %s AND %s
+    """, (*recurrence_ids, start_date, end_date))
+    return set(cur.fetchall())
+
+@invalidates("ClassSchedule")
+def materialize_sessions(rows, generated_through, batch_size=BULK_BATCH_SIZE):
+    """Insert generated sessions and advance each rule's horizon in one transaction.
+
+    rows are (ClassID, ScheduleDate, StartTime, EndTime, RecurrenceID) tuples;
+    generated_through holds (date, RecurrenceID) pairs.
+    """
+    db = get_db(); cur = db.cursor()
+    try:
+        for start in range(0, len(rows), batch_size):
+            cur.executemany("""
+                INSERT INTO ClassSchedule (ClassID, ScheduleDate, StartTime, EndTime, RecurrenceID)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE ScheduleID = ScheduleID
+            """, rows[start:start + batch_size])
+        if generated_through:
+            cur.executemany(
+                "UPDATE ClassRecurrence SET GeneratedThrough = %s WHERE RecurrenceID = %s",
+                generated_through
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+# ── ScheduleException ──
+def get_upcoming_exceptions():
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT e.*, c.ClassName
+        FROM ScheduleException e
+        LEFT JOIN ClassRecurrence r ON e.RecurrenceID = r.RecurrenceID
+        LEFT JOIN FitnessClass c ON r.ClassID = c.ClassID
+        WHERE e.ExceptionDate >= %s
+        ORDER BY e.ExceptionDate
+    """, (date.today(),))
+    return cur.fetchall()
+
+def get_exception_dates(start_date, end_date):
+    """Skipped dates in a window keyed by RecurrenceID; None holds gym-wide closures"""
+    db = get_db(); cur = db.cursor()
+    cur.execute("""
+        SELECT RecurrenceID, ExceptionDate FROM ScheduleException
+        WHERE ExceptionDate BETWEEN %s AND %s
+    """, (start_date, end_date))
+    closed = {}
+    for recurrence_id, day in cur.fetchall():
+        closed.setdefault(recurrence_id, set()).add(day)
+    return closed
+
+@invalidates("ClassSchedule")
+def create_schedule_exception(ExceptionDate, Reason=None, RecurrenceID=None):
+    """Record a skipped date and cancel any sessions already generated for it"""
+    db = get_db(); cur = db.cursor()
+    if RecurrenceID is None:
+        where, params = "s.ScheduleDate = %s AND s.RecurrenceID IS NOT NULL", (ExceptionDate,)
+    else:
+        where, params = "s.ScheduleDate = %s AND s.RecurrenceID = %s", (ExceptionDate, RecurrenceID)
+    try:
+        cur.execute(
+            "INSERT INTO ScheduleException (RecurrenceID, ExceptionDate, Reason) VALUES (%s, %s, %s)",
+            (RecurrenceID, ExceptionDate, Reason)
+        )
+        apply_rollups(cur, attendance_changes(cur, where, params, -1))
+        cur.execute(f"DELETE s FROM ClassSchedule s WHERE {where}", params)
+        cancelled = cur.rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return cancelled
+
+def delete_schedule_exception(exception_id):
+    """Remove a skipped date and rewind the affected rules so the date is generated again"""
+    db = get_db(); cur = db.cursor()
+    cur.execute(
+        "SELECT RecurrenceID, ExceptionDate FROM ScheduleException WHERE ExceptionID = %s",
+        (exception_id,)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return
+    recurrence_id, day = row
+    cur.execute("DELETE FROM ScheduleException WHERE ExceptionID = %s", (exception_id,))
+    cur.execute("""
+        UPDATE ClassRecurrence
+        SET GeneratedThrough = DATE_SUB(%s, INTERVAL 1 DAY)
+        WHERE GeneratedThrough >= %s AND (%s IS NULL OR RecurrenceID = %s)
+    """, (day, day, recurrence_id, recurrence_id))
+    db.commit()
+
+def get_sessions_in_range(start_date, end_date):
+    """Scheduled sessions between two dates with class, room, trainer and headcounts"""
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT s.ScheduleID, s.ClassID, s.ScheduleDate, s.StartTime, s.EndTime,
+               c.ClassName, c.Capacity, r.RoomName,
+               CONCAT(t.FirstName, ' ', t.LastName) AS TrainerName,
+               COALESCE(a.Booked, 0) AS Booked,
+               COALESCE(a.Waitlisted, 0) AS Waitlisted,
+               COALESCE(a.Present, 0) AS Present
+        FROM ClassSchedule s
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        LEFT JOIN Room r ON c.RoomID = r.RoomID
+        LEFT JOIN Trainer t ON c.TrainerID = t.TrainerID
+        LEFT JOIN (
+            SELECT a.ScheduleID,
+                   SUM(a.Status IS NULL OR a.Status <> 'waitlisted') AS Booked,
+                   SUM(a.Status = 'waitlisted') AS Waitlisted,
+                   SUM(a.Status = 'present') AS Present
+            FROM ClassSchedule s2
+            JOIN Attendance a ON a.ScheduleID = s2.ScheduleID
+            WHERE s2.ScheduleDate BETWEEN %s AND %s
+            GROUP BY a.ScheduleID
+        ) a ON a.ScheduleID = s.ScheduleID
+        WHERE s.ScheduleDate BETWEEN %s AND %s
+        ORDER BY s.ScheduleDate, s.StartTime
+    """, (start_date, end_date, start_date, end_date))
+    return cur.fetchall()
+
+def get_schedule_slots(start_date, end_date):
+    """Room and trainer for every session between two dates, for conflict checks"""
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT s.ScheduleID, s.ScheduleDate, s.StartTime, s.EndTime,
+               c.ClassID, c.ClassName, c.RoomID, c.TrainerID
+        FROM ClassSchedule s
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        WHERE s.ScheduleDate BETWEEN %s AND %s
+    """, (start_date, end_date))
+    return cur.fetchall()
+
+def get_schedule_events_in_range(start, end):
+    """Sessions overlapping [start, end) with their class, room and trainer names"""
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT s.ScheduleID, s.ScheduleDate, s.StartTime, s.EndTime,
+               c.ClassID, c.ClassName, r.RoomName,
+               CONCAT(t.FirstName, ' ', t.LastName) AS TrainerName
+        FROM ClassSchedule s
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        LEFT JOIN Room r ON c.RoomID = r.RoomID
+        LEFT JOIN Trainer t ON c.TrainerID = t.TrainerID
+        WHERE s.ScheduleDate BETWEEN %s AND %s
+          AND TIMESTAMP(s.ScheduleDate, s.StartTime) < %s
+          AND TIMESTAMP(s.ScheduleDate, s.EndTime) > %s
+        ORDER BY s.ScheduleDate, s.StartTime
+    """, (start.date(), end.date(), end, start))
+    return cur.fetchall()
+
+def get_attendance_in_range(start_date, end_date):
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT a.AttendanceID, a.MemberID, a.ScheduleID, a.Status,
+               m.FirstName, m.LastName,
+               c.ClassName, s.ScheduleDate, s.StartTime
+        FROM ClassSchedule s
+        JOIN Attendance a ON a.ScheduleID = s.ScheduleID
+        JOIN Member m ON a.MemberID = m.MemberID
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        WHERE s.ScheduleDate BETWEEN %s AND %s
+        ORDER BY s.ScheduleDate, s.StartTime, m.LastName
+    """, (start_date, end_date))
+    return cur.fetchall()
+
 def get_all_class_schedules():
     conn = get_db()
     cur = conn.cursor(dictionary=True)
@@ -526,32 +1749,367 @@ def get_all_attendance():
     cur.execute("SELECT * FROM Attendance")
     return cur.fetchall()
 
-def create_attendance(MemberID, ScheduleID, Status=None):
-    db = get_db(); cur = db.cursor()
+# ── Bookings ──
+# Every booking change for a session first locks that session's ClassSchedule
+# row, so concurrent requests for one class queue up on a single row while
+# other classes book in parallel. Seats are counted only under that lock.
+WAITLISTED = "waitlisted"
+SEAT_CONDITION = "(Status IS NULL OR Status <> 'waitlisted')"
+
+def begin(db):
+    # Reads earlier in the request may have opened a snapshot; start a fresh one
+    if db.in_transaction:
+        db.commit()
+    db.start_transaction(isolation_level="READ COMMITTED")
+
+def lock_schedule(cur, schedule_id):
+    """Lock a session row and return (capacity, seats taken), or None if it doesn't exist"""
+    cur.execute("""
+        SELECT c.Capacity
+        FROM ClassSchedule s
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        WHERE s.ScheduleID = %s
+        FOR UPDATE OF s
+    """, (schedule_id,))
+    row = cur.fetchone()
+    if row is None:
+        return None
     cur.execute(
-      "INSERT INTO Attendance (MemberID, ScheduleID, Status) VALUES (%s,%s,%s)",
-      (MemberID, ScheduleID, Status)
+        f"SELECT COUNT(*) FROM Attendance WHERE ScheduleID = %s AND {SEAT_CONDITION}",
+        (schedule_id,)
     )
-    db.commit()
+    return row[0], cur.fetchone()[0]
+
+def promote_waitlist(cur, schedule_id):
+    """Move the longest-waiting members into any free seats; caller holds the lock"""
+    capacity, taken = lock_schedule(cur, schedule_id)
+    if taken >= capacity:
+        return 0
+    cur.execute("""
+        SELECT AttendanceID, MemberID FROM Attendance
+        WHERE ScheduleID = %s AND Status = 'waitlisted'
+        ORDER BY AttendanceID
+        LIMIT %s
+    """, (schedule_id, capacity - taken))
+    promoted = cur.fetchall()
+    if promoted:
+        ids = [r[0] for r in promoted]
+        cur.execute(
+            f"UPDATE Attendance SET Status = 'booked' WHERE AttendanceID IN ({', '.join(['%s'] * len(ids))})",
+            ids
+        )
+        changes = []
+        for _, member_id in promoted:
+            changes.append((schedule_id, member_id, WAITLISTED, -1))
+            changes.append((schedule_id, member_id, "booked", 1))
+        apply_rollups(cur, changes)
+    return len(promoted)
+
+def waitlist_position(cur, schedule_id, attendance_id):
+    cur.execute("""
+        SELECT COUNT(*) FROM Attendance
+        WHERE ScheduleID = %s AND Status = 'waitlisted' AND AttendanceID <= %s
+    """, (schedule_id, attendance_id))
+    return cur.fetchone()[0]
+
+# ── Attendance Rollups ──
+# Per-class-day, per-room-hour and per-member-month counts, kept in step with
+# Attendance by every write below so reports never scan the raw table.
+# Changes are (ScheduleID, MemberID, Status, sign): +1 for a row that now
+# exists, -1 for one that no longer does. Session moves and deletes apply
+# them too; rollups.py rebuilds the tables from scratch.
+def session_hours(start, end):
+    """Clock hours a session touches, from TIME values given as timedeltas"""
+    return range(int(start.total_seconds() // 3600), math.ceil(end.total_seconds() / 3600))
+
+def status_counts(status):
+    status = (status or "").lower()
+    waiting = status == WAITLISTED
+    return (0 if waiting else 1), (1 if status == "present" else 0), (1 if waiting else 0)
+
+def apply_rollups(cur, changes):
+    if not changes:
+        return
+    # Form values arrive as strings; keys must compare equal to the DB's ints
+    changes = [(int(sid), int(mid), status, sign) for sid, mid, status, sign in changes]
+    schedule_ids = sorted({c[0] for c in changes})
+    cur.execute(f"""
+        SELECT s.ScheduleID, s.ClassID, c.RoomID, s.ScheduleDate, s.StartTime, s.EndTime
+        FROM ClassSchedule s
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        WHERE s.ScheduleID IN ({', '.join(['%s'] * len(schedule_ids))})
+    """, schedule_ids)
+    sessions = {row[0]: row for row in cur.fetchall()}
+
+    class_day = defaultdict(lambda: [0, 0, 0])
+    room_hour = defaultdict(int)
+    member_month = defaultdict(int)
+    for schedule_id, member_id, status, sign in changes:
+        if schedule_id not in sessions:
+            continue
+        _, class_id, room_id, day, start, end = sessions[schedule_id]
+        booked, present, waiting = status_counts(status)
+        totals = class_day[(class_id, day)]
+        totals[0] += sign * booked
+        totals[1] += sign * present
+        totals[2] += sign * waiting
+        if present:
+            for hour in session_hours(start, end):
+                room_hour[(room_id, day, hour)] += sign
+            member_month[(member_id, day.replace(day=1))] += sign
+
+    # Sorted keys keep lock order stable across concurrent transactions
+    rows = [(*k, *v) for k, v in sorted(class_day.items()) if any(v)]
+    if rows:
+        cur.executemany("""
+            INSERT INTO ClassDailyStats (ClassID, StatDate, Booked, Present, Waitlisted)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE Booked = Booked + VALUES(Booked),
+                                    Present = Present + VALUES(Present),
+                                    Waitlisted = Waitlisted + VALUES(Waitlisted)
+        """, rows)
+    rows = [(*k, v) for k, v in sorted(room_hour.items()) if v]
+    if rows:
+        cur.executemany("""
+            INSERT INTO RoomHourlyOccupancy (RoomID, StatDate, StatHour, Present)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE Present = Present + VALUES(Present)
+        """, rows)
+    rows = [(*k, v) for k, v in sorted(member_month.items()) if v]
+    if rows:
+        cur.executemany("""
+            INSERT INTO MemberMonthlyVisits (MemberID, StatMonth, Visits)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE Visits = Visits + VALUES(Visits)
+        """, rows)
+
+def existing_statuses(cur, pairs):
+    """Lock and return {(MemberID, ScheduleID): Status} for the rows that exist"""
+    found = {}
+    pairs = sorted(set(pairs))
+    for start in range(0, len(pairs), BULK_BATCH_SIZE):
+        chunk = pairs[start:start + BULK_BATCH_SIZE]
+        cur.execute(f"""
+            SELECT MemberID, ScheduleID, Status FROM Attendance
+            WHERE (MemberID, ScheduleID) IN ({', '.join(['(%s, %s)'] * len(chunk))})
+            FOR UPDATE
+        """, [v for pair in chunk for v in pair])
+        found.update({(m, sid): status for m, sid, status in cur.fetchall()})
+    return found
+
+def attendance_changes(cur, where, params, sign):
+    """Lock the attendance of the sessions matching `where` (over Attendance a
+    and ClassSchedule s) and return it as rollup changes with `sign`"""
+    cur.execute(f"""
+        SELECT a.ScheduleID, a.MemberID, a.Status
+        FROM Attendance a
+        JOIN ClassSchedule s ON a.ScheduleID = s.ScheduleID
+        WHERE {where}
+        FOR UPDATE
+    """, params)
+    return [(sid, mid, status, sign) for sid, mid, status in cur.fetchall()]
+
+def reverse_changes(changes):
+    return [(sid, mid, status, -sign) for sid, mid, status, sign in changes]
+
+def get_class_popularity(start_date, end_date):
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT c.ClassID, c.ClassName, c.Capacity,
+               COUNT(*) AS Days,
+               SUM(d.Booked) AS Booked,
+               SUM(d.Present) AS Present,
+               SUM(d.Waitlisted) AS Waitlisted
+        FROM ClassDailyStats d
+        JOIN FitnessClass c ON d.ClassID = c.ClassID
+        WHERE d.StatDate BETWEEN %s AND %s
+        GROUP BY c.ClassID, c.ClassName, c.Capacity
+        ORDER BY Present DESC, Booked DESC
+    """, (start_date, end_date))
+    return cur.fetchall()
+
+def get_room_utilisation(start_date, end_date):
+    """Average attendees per room and clock hour over the days that hour was used"""
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT r.RoomID, r.RoomName, r.Capacity, o.StatHour,
+               COUNT(*) AS Days,
+               SUM(o.Present) AS Present,
+               ROUND(SUM(o.Present) / COUNT(*), 1) AS AvgPresent
+        FROM RoomHourlyOccupancy o
+        JOIN Room r ON o.RoomID = r.RoomID
+        WHERE o.StatDate BETWEEN %s AND %s AND o.Present > 0
+        GROUP BY r.RoomID, r.RoomName, r.Capacity, o.StatHour
+        ORDER BY r.RoomName, o.StatHour
+    """, (start_date, end_date))
+    return cur.fetchall()
+
+def get_member_visits(month, limit=20):
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute("""
+        SELECT v.MemberID, m.FirstName, m.LastName, v.Visits
+        FROM MemberMonthlyVisits v
+        JOIN Member m ON v.MemberID = m.MemberID
+        WHERE v.StatMonth = %s AND v.Visits > 0
+        ORDER BY v.Visits DESC
+        LIMIT %s
+    """, (month, limit))
+    return cur.fetchall()
+
+class Booking:
+    def __init__(self, result, attendance_id=None, position=None):
+        self.result = result            # "booked", "waitlisted", "duplicate" or "missing"
+        self.attendance_id = attendance_id
+        self.position = position        # place in the waitlist, from 1
+
+def create_attendance(MemberID, ScheduleID, Status=None):
+    """Book a member into a session, waitlisting them when it is full"""
+    db = get_db(); cur = db.cursor()
+    begin(db)
+    try:
+        seats = lock_schedule(cur, ScheduleID)
+        if seats is None:
+            db.rollback()
+            return Booking("missing")
+        capacity, taken = seats
+
+        cur.execute(
+            "SELECT AttendanceID FROM Attendance WHERE ScheduleID = %s AND MemberID = %s",
+            (ScheduleID, MemberID)
+        )
+        existing = cur.fetchone()
+        if existing is not None:
+            db.rollback()
+            return Booking("duplicate", existing[0])
+
+        full = Status != WAITLISTED and taken >= capacity
+        status = WAITLISTED if full else (Status or "booked")
+        cur.execute(
+            "INSERT INTO Attendance (MemberID, ScheduleID, Status) VALUES (%s,%s,%s)",
+            (MemberID, ScheduleID, status)
+        )
+        attendance_id = cur.lastrowid
+        apply_rollups(cur, [(ScheduleID, MemberID, status, 1)])
+        position = waitlist_position(cur, ScheduleID, attendance_id) if status == WAITLISTED else None
+        db.commit()
+        return Booking("waitlisted" if status == WAITLISTED else "booked", attendance_id, position)
+    except mysql.connector.IntegrityError as e:
+        db.rollback()
+        if e.errno == 1062:
+            return Booking("duplicate")
+        raise
+    except Exception:
+        db.rollback()
+        raise
 
 def get_attendance_by_id(attendance_id):
     db = get_db(); cur = db.cursor(dictionary=True)
     cur.execute("SELECT * FROM Attendance WHERE AttendanceID = %s", (attendance_id,))
     return cur.fetchone()
 
-def update_attendance(attendance_id, member_id, schedule_id, status):
+def lock_attendance(cur, attendance_id, schedule_ids=()):
+    """Lock a booking's session(s), then the booking itself.
+
+    The booking is read first without a lock to learn its session, so it is
+    read again once the sessions are locked; returns (row, seats) with row
+    None when the booking is gone, or None if it moved in between.
+    """
+    cur.execute(
+        "SELECT ScheduleID, MemberID, Status FROM Attendance WHERE AttendanceID = %s",
+        (attendance_id,)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None, {}
+    # Lock in ID order so two opposite moves can't deadlock
+    seats = {}
+    for sid in sorted({row[0], *schedule_ids}):
+        seats[sid] = lock_schedule(cur, sid)
+    cur.execute(
+        "SELECT ScheduleID, MemberID, Status FROM Attendance WHERE AttendanceID = %s FOR UPDATE",
+        (attendance_id,)
+    )
+    locked = cur.fetchone()
+    if locked is not None and locked[0] != row[0]:
+        return None
+    return locked, seats
+
+def update_attendance(attendance_id, member_id, schedule_id, status, attempts=3):
+    """Edit a booking; moving it to a full session puts it on that session's waitlist"""
     db = get_db(); cur = db.cursor()
-    cur.execute("""
-        UPDATE Attendance
-        SET MemberID = %s, ScheduleID = %s, Status = %s
-        WHERE AttendanceID = %s
-    """, (member_id, schedule_id, status, attendance_id))
-    db.commit()
+    schedule_id = int(schedule_id)
+    begin(db)
+    try:
+        locked = lock_attendance(cur, attendance_id, (schedule_id,))
+        if locked is None:
+            # Moved by a concurrent edit before we held its session; start over
+            db.rollback()
+            if attempts > 1:
+                return update_attendance(attendance_id, member_id, schedule_id, status, attempts - 1)
+            return Booking("missing")
+        row, seats = locked
+        if row is None or seats[schedule_id] is None:
+            db.rollback()
+            return Booking("missing")
+        old_schedule, old_member, old_status = row
+
+        holds_seat = old_status != WAITLISTED and old_schedule == schedule_id
+        capacity, taken = seats[schedule_id]
+        if status != WAITLISTED and not holds_seat and taken >= capacity:
+            status = WAITLISTED
 
-def delete_attendance(attendance_id):
+        cur.execute("""
+            UPDATE Attendance
+            SET MemberID = %s, ScheduleID = %s, Status = %s
+            WHERE AttendanceID = %s
+        """, (member_id, schedule_id, status, attendance_id))
+        # The row is locked, so the deltas below are against the status it
+        # really had (rowcount counts changed rows and is 0 for a no-op edit)
+        apply_rollups(cur, [
+            (old_schedule, old_member, old_status, -1),
+            (schedule_id, member_id, status, 1)
+        ])
+        for sid in seats:
+            promote_waitlist(cur, sid)
+        db.commit()
+        return Booking("waitlisted" if status == WAITLISTED else "booked", attendance_id)
+    except mysql.connector.IntegrityError as e:
+        db.rollback()
+        if e.errno == 1062:
+            return Booking("duplicate", attendance_id)
+        raise
+    except Exception:
+        db.rollback()
+        raise
+
+def delete_attendance(attendance_id, attempts=3):
+    """Cancel a booking and hand its seat to the first member on the waitlist.
+
+    Returns how many members were promoted, or None if the booking was
+    already gone (e.g. the same cancel submitted twice).
+    """
     db = get_db(); cur = db.cursor()
-    cur.execute("DELETE FROM Attendance WHERE AttendanceID = %s", (attendance_id,))
-    db.commit()
+    begin(db)
+    try:
+        locked = lock_attendance(cur, attendance_id)
+        if locked is None:
+            db.rollback()
+            return delete_attendance(attendance_id, attempts - 1) if attempts > 1 else None
+        row, _ = locked
+        if row is None:
+            db.rollback()
+            return None
+        cur.execute("DELETE FROM Attendance WHERE AttendanceID = %s", (attendance_id,))
+        if cur.rowcount != 1:
+            db.rollback()
+            return None
+        apply_rollups(cur, [(row[0], row[1], row[2], -1)])
+        promoted = promote_waitlist(cur, row[0])
+        db.commit()
+        return promoted
+    except Exception:
+        db.rollback()
+        raise
 
 def delete_maintenance_log(log_id):
     db = get_db()
@@ -563,12 +2121,14 @@ def get_all_membership_plans():
     cursor.execute("SELECT * FROM MembershipPlan")
     return cursor.fetchall()
 
+@cached("MembershipPlan")
 def get_all_membership_plans():
     db = get_db()
     cursor = db.cursor(dictionary=True)
     cursor.execute("SELECT * FROM MembershipPlan")
     return cursor.fetchall()
 
+@invalidates("MembershipPlan")
 def add_membership_plan(name, fee, level):
     db = get_db()
     cursor = db.cursor()
@@ -578,6 +2138,7 @@ def add_membership_plan(name, fee, level):
     )
     db.commit()
 
+@touches("Member")
 def update_member_plan(member_id, plan_id):
     db = get_db()
     cursor = db.cursor()
@@ -586,7 +2147,9 @@ def update_member_plan(member_id, plan_id):
         (plan_id, member_id)
     )
     db.commit()
+    member_index.refresh(member_id)
 
+@invalidates("MembershipHistory")
 def record_membership_change(member_id, plan_id):
     db = get_db()
     cursor = db.cursor()
@@ -596,11 +2159,13 @@ def record_membership_change(member_id, plan_id):
     )
     db.commit()
 
+@invalidates("MembershipPlan")
 def delete_plan(plan_id):
     db = get_db(); cur = db.cursor()
     cur.execute("DELETE FROM MembershipPlan WHERE PlanID = %s", (plan_id,))
     db.commit()
 
+@invalidates("MembershipHistory")
 def add_membership_history(MemberID, PlanID, StartDate, EndDate=None):
     db = get_db()
     cur = db.cursor()
@@ -610,32 +2175,49 @@ def add_membership_history(MemberID, PlanID, StartDate, EndDate=None):
     )
     db.commit()
 
-def get_membership_history(mid=None):
+HISTORY_KEYSET = Keyset(
+    pk=("h.HistoryID", "HistoryID"),
+    sorts={"start": ("h.StartDate", "StartDate")},
+    filters={
+        "member": ("h.MemberID", "="),
+        "plan": ("h.PlanID", "="),
+        "from": ("h.StartDate", ">="),
+        "to": ("h.StartDate", "<=")
+    },
+    default_sort="start",
+    default_direction="desc"
+)
+
+HISTORY_LIST_SQL = """
+    SELECT h.HistoryID, h.MemberID, m.FirstName, m.LastName,
+           h.PlanID, p.PlanName, h.StartDate, h.EndDate
+    FROM MembershipHistory h
+    JOIN Member m ON h.MemberID = m.MemberID
+    JOIN MembershipPlan p ON h.PlanID = p.PlanID
+"""
+
+def get_membership_history(mid=None, page=None):
     db = get_db()
     cur = db.cursor(dictionary=True)
 
+    if page is not None:
+        if mid:
+            return fetch_page(cur, HISTORY_LIST_SQL, page, where=["h.MemberID = %s"], params=(mid,))
+        return fetch_page(cur, HISTORY_LIST_SQL, page)
+
     if mid:
-        cur.execute("""
-            SELECT h.HistoryID, h.MemberID, m.FirstName, m.LastName,
-                   h.PlanID, p.PlanName, h.StartDate, h.EndDate
-            FROM MembershipHistory h
-            JOIN Member m ON h.MemberID = m.MemberID
-            JOIN MembershipPlan p ON h.PlanID = p.PlanID
+        cur.execute(HISTORY_LIST_SQL + """
             WHERE h.MemberID = %s
             ORDER BY h.StartDate DESC
         """, (mid,))
     else:
-        cur.execute("""
-            SELECT h.HistoryID, h.MemberID, m.FirstName, m.LastName,
-                   h.PlanID, p.PlanName, h.StartDate, h.EndDate
-            FROM MembershipHistory h
-            JOIN Member m ON h.MemberID = m.MemberID
-            JOIN MembershipPlan p ON h.PlanID = p.PlanID
+        cur.execute(HISTORY_LIST_SQL + """
             ORDER BY h.StartDate DESC
         """)
 
     return cur.fetchall()
 
+@invalidates("MembershipHistory")
 def record_membership_change(member_id, plan_id):
     db = get_db()
     cursor = db.cursor()
@@ -645,6 +2227,7 @@ def record_membership_change(member_id, plan_id):
     )
     db.commit()
 
+@invalidates("MembershipHistory")
 def delete_membership_history(history_id):
     db = get_db()
     cursor = db.cursor()
@@ -682,12 +2265,14 @@ def get_member_id_by_history_id(hid):
     row = cursor.fetchone()
     return row[0] if row else None
 
+@invalidates("MembershipPlan")
 def delete_membership_plan(plan_id):
     db = get_db()
     cur = db.cursor()
     cur.execute("DELETE FROM MembershipPlan WHERE PlanID = %s", (plan_id,))
     db.commit()
 
+@invalidates("MembershipHistory")
 def update_membership_history(hid, plan_id, start_date, end_date=None):
     db = get_db()
     cur = db.cursor()
@@ -0,0 +1,157 @@
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Keyset:
+    """Describes how one list query can be sorted, filtered and seeked.
+
+    pk and each sort are (sql_expr, row_key) pairs; filters map a request
+    argument to (sql_expr, operator).
+    """
+
+    def __init__(self, pk, sorts=None, filters=None, default_sort="id", default_direction="asc"):
+        self.pk = pk
+        self.sorts = {"id": pk, **(sorts or {})}
+        self.filters = filters or {}
+        self.default_sort = default_sort
+        self.default_direction = default_direction
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) and len(values) == 2 else None
+
+
+class PageRequest:
+    def __init__(self, keyset, sort=None, direction=None, size=DEFAULT_PAGE_SIZE,
+                 after=None, before=None, filters=None):
+        self.keyset = keyset
+        self.sort = sort if sort in keyset.sorts else keyset.default_sort
+        self.direction = direction if direction in ("asc", "desc") else keyset.default_direction
+        self.size = max(1, min(int(size), MAX_PAGE_SIZE))
+        self.after = after
+        self.before = before
+        self.filters = {k: v for k, v in (filters or {}).items() if k in keyset.filters and v not in (None, "")}
+
+
+def page_request(args, keyset):
+    """Parse ?sort=&dir=&size=&after=&before= and the keyset's filters from request args"""
+    try:
+        size = int(args.get("size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+
+    return PageRequest(
+        keyset,
+        sort=args.get("sort"),
+        direction=args.get("dir"),
+        size=size,
+        after=decode_cursor(args.get("after")),
+        before=decode_cursor(args.get("before")),
+        filters={name: args.get(name) for name in keyset.filters}
+    )
+
+
+class Page:
+    def __init__(self, rows, request, has_next, has_prev):
+        self.rows = rows
+        self.request = request
+        self.has_next = has_next
+        self.has_prev = has_prev
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _cursor(self, row):
+        sort_key = self.request.keyset.sorts[self.request.sort][1]
+        pk_key = self.request.keyset.pk[1]
+        return encode_cursor([row[sort_key], row[pk_key]])
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.rows[-1]) if self.has_next and self.rows else None
+
+    @property
+    def prev_cursor(self):
+        return self._cursor(self.rows[0]) if self.has_prev and self.rows else None
+
+    def link_args(self, **overrides):
+        """Query args for url_for that keep the current sort, size and filters"""
+        args = dict(self.request.filters)
+        args.update(sort=self.request.sort, dir=self.request.direction, size=self.request.size)
+        args.update(overrides)
+        return {k: v for k, v in args.items() if v is not None}
+
+    def sort_args(self, sort):
+        """Query args for a column header link; clicking the active column flips direction"""
+        direction = "asc"
+        if sort == self.request.sort and self.request.direction == "asc":
+            direction = "desc"
+        return self.link_args(sort=sort, dir=direction)
+
+
+def fetch_page(cur, select_sql, req, where=None, params=()):
+    """Run select_sql as the PageRequest req; cur must be a dictionary cursor.
+
+    select_sql must not contain WHERE/ORDER BY/LIMIT — pass fixed conditions
+    through where/params instead.
+    """
+    keyset = req.keyset
+    clauses = list(where or [])
+    args = list(params)
+
+    for name, value in req.filters.items():
+        expr, op = keyset.filters[name]
+        clauses.append(f"{expr} {op} %s")
+        args.append(value)
+
+    sort_expr = keyset.sorts[req.sort][0]
+    pk_expr = keyset.pk[0]
+    backwards = req.before is not None
+    ascending = (req.direction == "asc") != backwards
+    cursor = req.before if backwards else req.after
+
+    if cursor is not None:
+        op = ">" if ascending else "<"
+        if sort_expr == pk_expr:
+            clauses.append(f"{pk_expr} {op} %s")
+            args.append(cursor[1])
+        else:
+            clauses.append(f"({sort_expr} {op} %s OR ({sort_expr} = %s AND {pk_expr} {op} %s))")
+            args.extend([cursor[0], cursor[0], cursor[1]])
+
+    order = "ASC" if ascending else "DESC"
+    order_by = f"{pk_expr} {order}" if sort_expr == pk_expr else f"{sort_expr} {order}, {pk_expr} {order}"
+
+    sql = select_sql
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order_by} LIMIT %s"
+    args.append(req.size + 1)
+
+    cur.execute(sql, tuple(args))
+    rows = cur.fetchall()
+    more = len(rows) > req.size
+    rows = rows[:req.size]
+
+    if backwards:
+        rows.reverse()
+        return Page(rows, req, has_next=True, has_prev=more)
+    return Page(rows, req, has_next=more, has_prev=cursor is not None)
@@ -0,0 +1,61 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Any werkzeug method string, e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1".
+# scrypt hashes run past 128 characters, so existing databases need PasswordHash widened first.
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+
+VERIFY_WORKERS = int(os.getenv("PASSWORD_VERIFY_WORKERS", str(os.cpu_count() or 2)))
+VERIFY_QUEUE = int(os.getenv("PASSWORD_VERIFY_QUEUE", "32"))
+VERIFY_TIMEOUT = float(os.getenv("PASSWORD_VERIFY_TIMEOUT", "10"))
+
+
+class VerifierBusy(Exception):
+    pass
+
+
+def hash_password(raw_password):
+    return generate_password_hash(raw_password, method=HASH_METHOD)
+
+
+_policy_prefix = None
+
+def needs_rehash(pw_hash):
+    """True when pw_hash was made with a different method or cost than the current policy"""
+    global _policy_prefix
+    if _policy_prefix is None:
+        # werkzeug fills in default costs, so read them back from a real hash
+        _policy_prefix = hash_password("").split("$", 1)[0]
+    return pw_hash.split("$", 1)[0] != _policy_prefix
+
+
+# Hash checks are CPU-bound; hashlib releases the GIL while it works, so a
+# small pool bounds how many run at once and the queue limit sheds load
+# instead of letting a login burst stall every request thread.
+_executor = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="password-verify")
+_pending = 0
+_pending_lock = threading.Lock()
+
+def _done(future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+def verify_password(pw_hash, raw_password):
+    """check_password_hash on the bounded worker pool; raises VerifierBusy when saturated"""
+    global _pending
+    with _pending_lock:
+        if _pending >= VERIFY_WORKERS + VERIFY_QUEUE:
+            raise VerifierBusy("Too many password checks in progress")
+        _pending += 1
+
+    future = _executor.submit(check_password_hash, pw_hash, raw_password)
+    future.add_done_callback(_done)
+    try:
+        return future.result(timeout=VERIFY_TIMEOUT)
+    except TimeoutError:
+        raise VerifierBusy("Password check timed out")
+
@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import models
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("RECONCILE_BATCH", "1000"))
+# Seconds between runs inside the app; 0 leaves scheduling to cron
+INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "0"))
+# Breather between batches so member edits never queue behind the job
+PAUSE = 0.05
+LOCK_NAME = "gymdb_membership_reconcile"
+
+
+class RunReport:
+    def __init__(self, today):
+        self.today = today
+        self.started = datetime.now()
+        self.batches = 0
+        self.activated = 0
+        self.deactivated = 0
+        self.plans = 0
+        self.elapsed_ms = 0.0
+
+    def add(self, changes):
+        self.batches += 1
+        for _, field, _, new in changes:
+            if field == "CurrentPlanID":
+                self.plans += 1
+            elif new == "active":
+                self.activated += 1
+            else:
+                self.deactivated += 1
+
+    @property
+    def changed(self):
+        return self.activated + self.deactivated + self.plans
+
+    def as_dict(self):
+        return {
+            "date": self.today.isoformat(),
+            "started": self.started.isoformat(sep=" ", timespec="seconds"),
+            "batches": self.batches,
+            "activated": self.activated,
+            "deactivated": self.deactivated,
+            "plans_aligned": self.plans,
+            "elapsed_ms": self.elapsed_ms
+        }
+
+
+last_report = None
+
+
+def run(today=None, batch_size=BATCH_SIZE):
+    """Bring every member's status and plan in line with their history.
+
+    Works through Member in MemberID batches, each its own short
+    transaction. A MySQL named lock keeps concurrent runs (several workers,
+    or cron next to the app) from overlapping; returns None if one is
+    already going.
+    """
+    global last_report
+    today = today or date.today()
+    db = models.get_db()
+    cur = db.cursor()
+    cur.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+    if cur.fetchone()[0] != 1:
+        logger.info("Membership reconcile already running elsewhere; skipped")
+        return None
+
+    report = RunReport(today)
+    started = time.perf_counter()
+    try:
+        after = 0
+        while after is not None:
+            after, changes = models.reconcile_members(after, batch_size, today)
+            report.add(changes)
+            if after is not None:
+                time.sleep(PAUSE)
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cur.fetchone()
+        if report.changed:
+            # Lookup indexes and cached reports reload on next use
+            models.invalidate_table("Member")
+
+    report.elapsed_ms = round(1000 * (time.perf_counter() - started), 2)
+    last_report = report
+    logger.info(f"Membership reconcile: {report.activated} activated, {report.deactivated} deactivated, "
+                f"{report.plans} plans aligned in {report.batches} batches")
+    return report
+
+
+_thread = None
+
+
+def _loop(app):
+    while True:
+        time.sleep(INTERVAL)
+        try:
+            with app.app_context():
+                run()
+        except Exception as e:
+            logger.error(f"Membership reconcile failed, will retry next interval: {e}")
+
+
+def init_app(app):
+    global _thread
+    if INTERVAL <= 0 or _thread is not None:
+        return
+    _thread = threading.Thread(target=_loop, args=(app,), name="reconcile", daemon=True)
+    _thread.start()
+
+
+def stats():
+    return {
+        "interval": INTERVAL,
+        "last_run": last_report.as_dict() if last_report else None
+    }
+
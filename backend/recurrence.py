@@ -0,0 +1,99 @@
+import logging
+import os
+from datetime import date, timedelta
+
+import models
+import scheduling
+
+logger = logging.getLogger(__name__)
+
+HORIZON_DAYS = int(os.getenv("RECURRENCE_HORIZON_DAYS", "56"))
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def parse_weekdays(values):
+    """Normalise ["Mon", "wed"] or "mon,wed" to the stored "mon,wed" form"""
+    if isinstance(values, str):
+        values = values.split(",")
+    days = {v.strip().lower()[:3] for v in values if v.strip()}
+    unknown = days - set(WEEKDAYS)
+    if unknown or not days:
+        raise ValueError("Pick at least one weekday")
+    return ",".join(d for d in WEEKDAYS if d in days)
+
+
+def occurrences(rule, first, last, skipped):
+    weekdays = {WEEKDAYS.index(d) for d in rule["Weekdays"].split(",")}
+    day = first
+    while day <= last:
+        if day.weekday() in weekdays and day not in skipped:
+            yield day
+        day += timedelta(days=1)
+
+
+class ExtendReport:
+    def __init__(self):
+        self.rules = 0
+        self.created = 0
+        self.skipped = []       # (session, [conflict messages])
+        self.warnings = 0
+
+
+def extend(through=None, recurrence_ids=None):
+    """Generate sessions for every rule up to `through` (default: the horizon).
+
+    Each rule resumes from its GeneratedThrough date, so a periodic run only
+    adds the days that have come into the horizon since the last one. The
+    whole batch is conflict-checked at once and written in one transaction;
+    sessions that would double-book a room or trainer are left out.
+    """
+    today = date.today()
+    through = through or today + timedelta(days=HORIZON_DAYS)
+    report = ExtendReport()
+
+    rules = models.get_recurrences_due(through)
+    if recurrence_ids is not None:
+        rules = [r for r in rules if r["RecurrenceID"] in recurrence_ids]
+    if not rules:
+        return report
+
+    windows = {}
+    for rule in rules:
+        resume = rule["GeneratedThrough"] + timedelta(days=1) if rule["GeneratedThrough"] else rule["StartDate"]
+        first = max(resume, rule["StartDate"], today)
+        last = min(through, rule["EndDate"]) if rule["EndDate"] else through
+        windows[rule["RecurrenceID"]] = (first, last)
+
+    first = min(w[0] for w in windows.values())
+    last = max(w[1] for w in windows.values())
+    closed = models.get_exception_dates(first, last)
+    generated = models.get_generated_dates(list(windows), first, last)
+
+    proposals = []
+    for rule in rules:
+        rid = rule["RecurrenceID"]
+        skipped = closed.get(None, set()) | closed.get(rid, set())
+        for day in occurrences(rule, *windows[rid], skipped):
+            if (rid, day) in generated:
+                continue
+            session = scheduling.Session(rule["ClassID"], day, rule["StartTime"], rule["EndTime"])
+            proposals.append((rid, session))
+
+    rows = []
+    for (rid, session), conflicts in zip(proposals, scheduling.find_conflicts([p[1] for p in proposals])):
+        if any(c.blocking for c in conflicts):
+            report.skipped.append((session, [c.message() for c in conflicts]))
+            continue
+        report.warnings += len(conflicts)
+        rows.append((session.class_id, session.date, session.start, session.end, rid))
+
+    # Rules whose window is already past their end date still get marked done
+    progress = [(max(end, start - timedelta(days=1)), rid) for rid, (start, end) in windows.items()]
+    models.materialize_sessions(rows, progress)
+
+    report.rules = len(rules)
+    report.created = len(rows)
+    logger.info(f"Recurring schedules: {report.created} sessions created for {report.rules} rules, "
+                f"{len(report.skipped)} skipped for conflicts")
+    return report
+
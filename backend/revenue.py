@@ -0,0 +1,258 @@
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import models
+
+SOURCE_TABLES = ("Payments", "MembershipHistory", "Member", "MembershipPlan")
+# Not every member write bumps a generation, so the ledger also ages out
+LEDGER_TTL = float(os.getenv("REVENUE_TTL", "300"))
+
+# Open-ended history rows end "never"
+OPEN_END = np.iinfo(np.int64).max
+
+
+def day_numbers(values):
+    """Dates as days since 1970-01-01; None becomes OPEN_END"""
+    days = np.array(values, dtype="datetime64[D]")
+    return np.where(np.isnat(days), OPEN_END, days.astype(np.int64))
+
+
+def month_number(value):
+    """A date as months since 1970-01, the same scale as Ledger.pay_month"""
+    return (value.year - 1970) * 12 + value.month - 1
+
+
+def month_date(number):
+    return date(1970 + int(number) // 12, int(number) % 12 + 1, 1)
+
+
+def money(cents):
+    return round(float(cents) / 100, 2)
+
+
+def month_end(value):
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+class Ledger:
+    """Payments, plan periods and plans loaded once as parallel NumPy arrays.
+
+    Each payment is attributed to the plan the member held on its date,
+    falling back to their current plan when history does not cover it.
+    Plans are stored as indexes into `plan_names`, with the last slot
+    meaning "no plan", so every group-by is a single bincount.
+    """
+
+    def __init__(self, payments, periods, current, plans):
+        plans = sorted(plans, key=lambda p: p["PlanID"])
+        self.plan_ids = np.array([p["PlanID"] for p in plans], dtype=np.int64)
+        self.plan_names = [p["PlanName"] for p in plans] + ["No plan"]
+        self.plan_fees = np.array(
+            [round(float(p["MonthlyFee"] or 0) * 100) for p in plans] + [0], dtype=np.int64
+        )
+        self.no_plan = len(plans)
+
+        member, amount, paid_on, method, status = zip(*payments) if payments else ([], [], [], [], [])
+        self.pay_member = np.array(member, dtype=np.int64)
+        self.pay_cents = np.rint(np.array(amount, dtype=np.float64) * 100).astype(np.int64)
+        self.pay_day = day_numbers(paid_on)
+        self.pay_month = self.pay_day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        labels = np.array([(m or "").strip().capitalize() or "Unspecified" for m in method], dtype=object)
+        self.methods, self.pay_method = np.unique(labels, return_inverse=True)
+        # Same rule as the admin dashboard: everything not pending is revenue
+        self.pending = np.array([models.payment_pending(s) for s in status], dtype=bool)
+        self.collected = ~self.pending
+
+        member, plan, start, end = zip(*periods) if periods else ([], [], [], [])
+        self.hist_member = np.array(member, dtype=np.int64)
+        self.hist_plan = self.plan_index(np.array(plan, dtype=np.int64))
+        self.hist_start = day_numbers(start)
+        self.hist_end = day_numbers(end)
+
+        member, plan = zip(*current) if current else ([], [])
+        self.cur_member = np.array(member, dtype=np.int64)
+        self.cur_plan = self.plan_index(np.array([p if p is not None else -1 for p in plan], dtype=np.int64))
+
+        self.pay_plan = self.plan_on(self.pay_member, self.pay_day)
+
+    def plan_index(self, plan_ids):
+        if not len(self.plan_ids):
+            return np.full(len(plan_ids), self.no_plan, dtype=np.int64)
+        idx = np.searchsorted(self.plan_ids, plan_ids)
+        idx = np.minimum(idx, len(self.plan_ids) - 1)
+        return np.where(self.plan_ids[idx] == plan_ids, idx, self.no_plan)
+
+    def plan_on(self, members, days):
+        """Plan index held by each member on each day"""
+        plan = np.full(len(members), self.no_plan, dtype=np.int64)
+        if len(self.cur_member):
+            idx = np.minimum(np.searchsorted(self.cur_member, members), len(self.cur_member) - 1)
+            plan = np.where(self.cur_member[idx] == members, self.cur_plan[idx], plan)
+        if len(self.hist_member):
+            # History is sorted by (member, start), so the last period starting
+            # on or before the day is the only one that can cover it
+            key = (self.hist_member << 32) + self.hist_start
+            idx = np.searchsorted(key, (members << 32) + days, side="right") - 1
+            safe = np.maximum(idx, 0)
+            covered = (idx >= 0) & (self.hist_member[safe] == members) & (self.hist_end[safe] >= days)
+            plan = np.where(covered, self.hist_plan[safe], plan)
+        return plan
+
+    def monthly_series(self, first, last):
+        """Collected and pending totals per month, first..last inclusive"""
+        lo, hi = month_number(first), month_number(last)
+        in_range = (self.pay_month >= lo) & (self.pay_month <= hi)
+        slot = self.pay_month - lo
+        size = hi - lo + 1
+
+        def total(mask):
+            return np.bincount(slot[mask], weights=self.pay_cents[mask], minlength=size)
+
+        collected = total(in_range & self.collected)
+        pending = total(in_range & self.pending)
+        payments = np.bincount(slot[in_range & self.collected], minlength=size)
+        return [
+            {
+                "month": month_date(lo + i),
+                "collected": money(collected[i]),
+                "pending": money(pending[i]),
+                "payments": int(payments[i])
+            }
+            for i in range(size)
+        ]
+
+    def month_report(self, month, as_of):
+        number = month_number(month)
+        in_month = self.pay_month == number
+        paid = in_month & self.collected
+
+        by_plan = np.bincount(self.pay_plan[paid], weights=self.pay_cents[paid], minlength=self.no_plan + 1)
+        plan_counts = np.bincount(self.pay_plan[paid], minlength=self.no_plan + 1)
+        plans = [
+            {"plan": self.plan_names[i], "revenue": money(by_plan[i]), "payments": int(plan_counts[i])}
+            for i in np.argsort(-by_plan, kind="stable") if plan_counts[i]
+        ]
+
+        total = int(self.pay_cents[paid].sum())
+        by_method = np.bincount(self.pay_method[paid], weights=self.pay_cents[paid], minlength=len(self.methods))
+        method_counts = np.bincount(self.pay_method[paid], minlength=len(self.methods))
+        methods = [
+            {
+                "method": str(self.methods[i]),
+                "revenue": money(by_method[i]),
+                "payments": int(method_counts[i]),
+                "share": round(100 * float(by_method[i]) / total, 1) if total else 0.0
+            }
+            for i in np.argsort(-by_method, kind="stable") if method_counts[i]
+        ]
+
+        cutoff = day_numbers([as_of])[0]
+        owed = self.pending & (self.pay_day <= cutoff)
+        debtors, slot = np.unique(self.pay_member[owed], return_inverse=True)
+        balances = np.bincount(slot, weights=self.pay_cents[owed], minlength=len(debtors))
+        top = np.argsort(-balances, kind="stable")[:10]
+
+        # MRR: fees of the plans members hold on the as-of day
+        active = (self.hist_start <= cutoff) & (self.hist_end >= cutoff)
+        members, first = np.unique(self.hist_member[active][::-1], return_index=True)
+        held = self.hist_plan[active][::-1][first]
+        mrr = int(self.plan_fees[held].sum())
+
+        return {
+            "month": month,
+            "as_of": as_of,
+            "revenue": money(total),
+            "payments": int(paid.sum()),
+            "pending": money(self.pay_cents[in_month & self.pending].sum()),
+            "by_plan": plans,
+            "by_method": methods,
+            "outstanding": money(self.pay_cents[owed].sum()),
+            "outstanding_members": len(debtors),
+            "top_outstanding": [
+                {"member_id": int(debtors[i]), "balance": money(balances[i])} for i in top
+            ],
+            "mrr": money(mrr),
+            "paying_members": len(members),
+            "arpu": money(mrr / len(members)) if len(members) else 0.0
+        }
+
+
+_lock = threading.Lock()
+_ledger = None
+_ledger_generation = None
+_ledger_loaded = 0.0
+_closed = {}
+_closed_generation = None
+
+
+def generation():
+    return tuple(models._generations.get(t, 0) for t in SOURCE_TABLES)
+
+
+def ledger():
+    """The current Ledger, reloaded after a write to one of its tables or once stale"""
+    global _ledger, _ledger_generation, _ledger_loaded
+    current = generation()
+    with _lock:
+        fresh = time.monotonic() - _ledger_loaded < LEDGER_TTL
+        if _ledger is not None and _ledger_generation == current and fresh:
+            return _ledger
+    loaded = Ledger(
+        models.get_payment_facts(),
+        models.get_plan_periods(),
+        models.get_current_plans(),
+        models.get_all_plans()
+    )
+    with _lock:
+        # Keep it only if no write raced with the load
+        if generation() == current:
+            _ledger, _ledger_generation, _ledger_loaded = loaded, current, time.monotonic()
+    return loaded
+
+
+def month_report(month, today=None):
+    """Revenue figures for the month containing `month`.
+
+    Closed months are computed once and kept until the next write to the
+    source tables (a back-dated payment, a billing run for a past month);
+    the running month follows the live tables.
+    """
+    global _closed_generation
+    today = today or date.today()
+    month = month.replace(day=1)
+    closed = month < today.replace(day=1)
+    current = generation()
+    if closed:
+        with _lock:
+            if _closed_generation != current:
+                _closed.clear()
+                _closed_generation = current
+            if month in _closed:
+                return _closed[month]
+
+    report = ledger().month_report(month, month_end(month) if closed else today)
+    if closed:
+        with _lock:
+            if _closed_generation == current == generation():
+                _closed[month] = report
+    return report
+
+
+def monthly_series(months=12, today=None):
+    today = today or date.today()
+    last = today.replace(day=1)
+    first = month_date(month_number(last) - months + 1)
+    return ledger().monthly_series(first, last)
+
+
+def forget(month=None):
+    """Drop cached closed months, e.g. after editing Payments outside the app"""
+    with _lock:
+        if month is None:
+            _closed.clear()
+        else:
+            _closed.pop(month.replace(day=1), None)
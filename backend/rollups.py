@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# 0..23 as a derived table, for spreading sessions over the hours they touch
+HOURS = " UNION ALL ".join(f"SELECT {h} AS StatHour" for h in range(24))
+
+
+def month_bounds(first):
+    """First and last day of the month containing `first`"""
+    first = first.replace(day=1)
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first, following - timedelta(days=1)
+
+
+def rebuild(cur, first=None, last=None):
+    """Recompute the rollups for sessions dated first..last (both optional).
+
+    Runs on the caller's cursor and transaction. The range must cover whole
+    months, since member visits are stored per month.
+    """
+    where, params = [], []
+    if first is not None:
+        where.append("s.ScheduleDate >= %s")
+        params.append(first)
+    if last is not None:
+        where.append("s.ScheduleDate <= %s")
+        params.append(last)
+    session_filter = f"AND {' AND '.join(where)}" if where else ""
+    stat_filter = session_filter.replace("s.ScheduleDate", "StatDate")
+    month_filter = session_filter.replace("s.ScheduleDate", "StatMonth")
+
+    cur.execute(f"DELETE FROM ClassDailyStats WHERE 1 = 1 {stat_filter}", params)
+    cur.execute(f"""
+        INSERT INTO ClassDailyStats (ClassID, StatDate, Booked, Present, Waitlisted)
+        SELECT s.ClassID, s.ScheduleDate,
+               SUM(a.Status IS NULL OR a.Status <> 'waitlisted'),
+               SUM(COALESCE(a.Status, '') = 'present'),
+               SUM(COALESCE(a.Status, '') = 'waitlisted')
+        FROM ClassSchedule s
+        JOIN Attendance a ON a.ScheduleID = s.ScheduleID
+        WHERE 1 = 1 {session_filter}
+        GROUP BY s.ClassID, s.ScheduleDate
+    """, params)
+
+    cur.execute(f"DELETE FROM RoomHourlyOccupancy WHERE 1 = 1 {stat_filter}", params)
+    cur.execute(f"""
+        INSERT INTO RoomHourlyOccupancy (RoomID, StatDate, StatHour, Present)
+        SELECT c.RoomID, s.ScheduleDate, h.StatHour, COUNT(*)
+        FROM ClassSchedule s
+        JOIN FitnessClass c ON s.ClassID = c.ClassID
+        JOIN Attendance a ON a.ScheduleID = s.ScheduleID AND a.Status = 'present'
+        JOIN ({HOURS}) h
+          ON h.StatHour >= HOUR(s.StartTime)
+         AND h.StatHour < CEIL(TIME_TO_SEC(s.EndTime) / 3600)
+        WHERE c.RoomID IS NOT NULL {session_filter}
+        GROUP BY c.RoomID, s.ScheduleDate, h.StatHour
+    """, params)
+
+    cur.execute(f"DELETE FROM MemberMonthlyVisits WHERE 1 = 1 {month_filter}", params)
+    cur.execute(f"""
+        INSERT INTO MemberMonthlyVisits (MemberID, StatMonth, Visits)
+        SELECT a.MemberID,
+               DATE_SUB(s.ScheduleDate, INTERVAL DAYOFMONTH(s.ScheduleDate) - 1 DAY),
+               COUNT(*)
+        FROM ClassSchedule s
+        JOIN Attendance a ON a.ScheduleID = s.ScheduleID AND a.Status = 'present'
+        WHERE 1 = 1 {session_filter}
+        GROUP BY a.MemberID, DATE_SUB(s.ScheduleDate, INTERVAL DAYOFMONTH(s.ScheduleDate) - 1 DAY)
+    """, params)
+
+
+def rebuild_months(first, last):
+    """Rebuild month by month, one short transaction each, so bookings are not held up"""
+    db = models.get_db()
+    cur = db.cursor()
+    month = first.replace(day=1)
+    count = 0
+    while month <= last:
+        start, end = month_bounds(month)
+        try:
+            rebuild(cur, start, end)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info(f"Rollups rebuilt for {month:%Y-%m}")
+        count += 1
+        month = end + timedelta(days=1)
+    return count
+
+
+def schedule_span():
+    db = models.get_db()
+    cur = db.cursor()
+    cur.execute("SELECT MIN(ScheduleDate), MAX(ScheduleDate) FROM ClassSchedule")
+    return cur.fetchone()
+
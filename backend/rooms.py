@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 import functools
 import models
+from etags import conditional
 
 rooms_bp = Blueprint("rooms", __name__, url_prefix="/rooms")
 
@@ -18,6 +19,7 @@ def roles_required(*roles):
 @rooms_bp.route("/")
 @login_required
 @roles_required("admin","manager")
+@conditional("Room")
 def list_rooms():
     rs = models.get_all_rooms()
     return render_template("rooms.html", rooms=rs)
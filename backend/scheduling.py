@@ -0,0 +1,154 @@
+import bisect
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+import models
+
+# Clashes on these resources block a session; calendar events only warn
+BLOCKING = ("room", "trainer")
+
+
+def as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def as_offset(value):
+    """Time of day as a timedelta from midnight, the way MySQL returns TIME"""
+    if isinstance(value, timedelta):
+        return value
+    if isinstance(value, time):
+        return timedelta(hours=value.hour, minutes=value.minute, seconds=value.second)
+    parts = [int(p) for p in str(value).split(":")]
+    return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2] if len(parts) > 2 else 0)
+
+
+class Session:
+    """A proposed ClassSchedule row; schedule_id is set when editing an existing one"""
+
+    def __init__(self, class_id, schedule_date, start, end, schedule_id=None):
+        self.class_id = int(class_id)
+        self.date = as_date(schedule_date)
+        self.start = as_offset(start)
+        self.end = as_offset(end)
+        self.schedule_id = int(schedule_id) if schedule_id is not None else None
+
+    def describe(self):
+        return f"{self.date} {str(self.start)[:-3]}-{str(self.end)[:-3]}"
+
+
+class Conflict:
+    def __init__(self, kind, session, other, label):
+        self.kind = kind
+        self.session = session
+        self.other = other
+        self.label = label
+
+    @property
+    def blocking(self):
+        return self.kind in BLOCKING
+
+    def message(self):
+        return f"{self.label} is already booked {self.other}"
+
+
+class DayIndex:
+    """Intervals per (day, resource), sorted by start so overlaps are a bisect away"""
+
+    def __init__(self):
+        self._starts = defaultdict(list)
+        self._items = defaultdict(list)
+
+    def add(self, key, start, end, item):
+        i = bisect.bisect_right(self._starts[key], start)
+        self._starts[key].insert(i, start)
+        self._items[key].insert(i, (start, end, item))
+
+    def overlapping(self, key, start, end):
+        # Anything starting at or after `end` cannot overlap
+        stop = bisect.bisect_left(self._starts.get(key, []), end)
+        return [item for s, e, item in self._items.get(key, [])[:stop] if e > start]
+
+
+def session_label(row):
+    start, end = as_offset(row["StartTime"]), as_offset(row["EndTime"])
+    return f"by {row['ClassName']} on {row['ScheduleDate']} {str(start)[:-3]}-{str(end)[:-3]}"
+
+
+def event_label(row):
+    return f"by event '{row['Title']}' ({row['StartTime']:%Y-%m-%d %H:%M}-{row['EndTime']:%H:%M})"
+
+
+def find_conflicts(sessions):
+    """Check proposed sessions against the schedule, calendar events and each other.
+
+    All existing rows for the covered dates are read with two range queries,
+    so checking hundreds of generated sessions costs the same round-trips as
+    checking one. Returns a list of conflicts per session, in input order.
+    """
+    if not sessions:
+        return []
+
+    classes = {c["ClassID"]: c for c in models.get_all_classes()}
+    rooms = {r["RoomID"]: r["RoomName"] for r in models.get_all_rooms()}
+    room_ids = {name.strip().lower(): rid for rid, name in rooms.items() if name}
+
+    first = min(s.date for s in sessions)
+    last = max(s.date for s in sessions)
+    index = DayIndex()
+    replaced = {s.schedule_id for s in sessions if s.schedule_id is not None}
+
+    for row in models.get_schedule_slots(first, last):
+        if row["ScheduleID"] in replaced:
+            continue
+        start, end = as_offset(row["StartTime"]), as_offset(row["EndTime"])
+        label = session_label(row)
+        index.add(("room", row["RoomID"], row["ScheduleDate"]), start, end, label)
+        index.add(("trainer", row["TrainerID"], row["ScheduleDate"]), start, end, label)
+
+    window_start = datetime.combine(first, time.min)
+    window_end = datetime.combine(last + timedelta(days=1), time.min)
+    for event in models.get_events_in_range(window_start, window_end):
+        room_id = room_ids.get((event["Location"] or "").strip().lower())
+        if room_id is None:
+            continue
+        label = event_label(event)
+        # Events may run past midnight, so index them on every day they touch
+        day = event["StartTime"].date()
+        while day <= event["EndTime"].date():
+            midnight = datetime.combine(day, time.min)
+            start = max(event["StartTime"], midnight) - midnight
+            end = min(event["EndTime"], midnight + timedelta(days=1)) - midnight
+            index.add(("event", room_id, day), start, end, label)
+            day += timedelta(days=1)
+
+    results = []
+    for session in sessions:
+        cls = classes.get(session.class_id)
+        found = []
+        if cls is None:
+            results.append(found)
+            continue
+
+        room = rooms.get(cls["RoomID"], f"Room {cls['RoomID']}")
+        checks = [
+            ("room", cls["RoomID"], room),
+            ("trainer", cls["TrainerID"], "The trainer"),
+            ("event", cls["RoomID"], room),
+        ]
+        for kind, resource, name in checks:
+            for other in index.overlapping((kind, resource, session.date), session.start, session.end):
+                found.append(Conflict(kind, session, other, name))
+        results.append(found)
+        if any(c.blocking for c in found):
+            continue
+
+        # Later sessions in the same batch must not collide with this one
+        label = f"by {cls['ClassName']} on {session.describe()} (in this batch)"
+        index.add(("room", cls["RoomID"], session.date), session.start, session.end, label)
+        index.add(("trainer", cls["TrainerID"], session.date), session.start, session.end, label)
+
+    return results
+
+
+def check_session(session):
+    return find_conflicts([session])[0]
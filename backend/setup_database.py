@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     import db_init
+    import migrations
     
     def main():
         """Main function to set up the database"""
@@ -21,6 +22,10 @@ try:
             # Check if database already exists
             if db_init.check_database_exists():
                 print("✓ Database already exists and is properly configured.")
+
+                # Existing databases still get any new schema migrations
+                version = migrations.migrate()
+                print(f"✓ Schema migrations applied (version {version}).")
                 
                 # Ask user if they want to reinitialize
                 response = input("\nDo you want to reinitialize the database? (y/N): ").lower()
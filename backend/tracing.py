@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from collections import deque
+
+from flask import g, request, has_app_context
+
+import db_pool
+
+SAMPLES_PER_ENDPOINT = int(os.getenv("TRACE_SAMPLES", "1000"))
+STATEMENT_PREVIEW = 200
+
+
+class RequestTrace:
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+
+    def record(self, sql, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed >= self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_sql = sql
+
+
+def current_trace():
+    if not has_app_context():
+        return None
+    if "sql_trace" not in g:
+        g.sql_trace = RequestTrace()
+    return g.sql_trace
+
+
+def preview(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    sql = " ".join(str(sql).split())
+    return sql if len(sql) <= STATEMENT_PREVIEW else sql[:STATEMENT_PREVIEW] + "…"
+
+
+class TracingCursor:
+    """Cursor proxy that times statements and counts fetched rows for the current request"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count(1)
+            yield row
+
+    def _timed(self, fn, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(operation, *args, **kwargs)
+        finally:
+            trace = current_trace()
+            if trace is not None:
+                trace.record(operation, time.perf_counter() - started)
+
+    def _count(self, n):
+        trace = current_trace()
+        if trace is not None:
+            trace.rows += n
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.latencies = deque(maxlen=SAMPLES_PER_ENDPOINT)
+        self.queries = deque(maxlen=SAMPLES_PER_ENDPOINT)
+        self.db_times = deque(maxlen=SAMPLES_PER_ENDPOINT)
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+
+
+_endpoints = {}
+_lock = threading.Lock()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def record_request(endpoint, elapsed, trace):
+    with _lock:
+        stats = _endpoints.setdefault(endpoint, EndpointStats())
+        stats.requests += 1
+        stats.latencies.append(elapsed)
+        stats.queries.append(trace.queries)
+        stats.db_times.append(trace.db_time)
+        if trace.slowest_sql is not None and trace.slowest_time >= stats.slowest_time:
+            stats.slowest_time = trace.slowest_time
+            stats.slowest_sql = preview(trace.slowest_sql)
+
+
+def endpoint_report():
+    """Per-endpoint latency percentiles and query counts over the recent samples"""
+    with _lock:
+        snapshot = [
+            (name, s.requests, sorted(s.latencies), list(s.queries), list(s.db_times), s.slowest_time, s.slowest_sql)
+            for name, s in _endpoints.items()
+        ]
+
+    report = []
+    for name, requests, latencies, queries, db_times, slowest_time, slowest_sql in snapshot:
+        samples = len(latencies) or 1
+        report.append({
+            "endpoint": name,
+            "requests": requests,
+            "p50_ms": round(1000 * percentile(latencies, 50), 2),
+            "p95_ms": round(1000 * percentile(latencies, 95), 2),
+            "max_ms": round(1000 * (latencies[-1] if latencies else 0), 2),
+            "queries_per_request": round(sum(queries) / samples, 2),
+            "db_ms_per_request": round(1000 * sum(db_times) / samples, 2),
+            "slowest_ms": round(1000 * slowest_time, 2),
+            "slowest_sql": slowest_sql
+        })
+    return sorted(report, key=lambda r: r["p95_ms"], reverse=True)
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+
+def _finish_request(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+
+    elapsed = time.perf_counter() - started
+    trace = current_trace()
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={1000 * trace.db_time:.2f};desc="{trace.queries} queries, {trace.rows} rows"'
+    )
+    if trace.slowest_sql is not None:
+        response.headers.add("Server-Timing", f"db-slowest;dur={1000 * trace.slowest_time:.2f}")
+    response.headers.add("Server-Timing", f"app;dur={1000 * elapsed:.2f}")
+
+    if request.endpoint and request.endpoint != "static":
+        record_request(request.endpoint, elapsed, trace)
+    return response
+
+
+def init_app(app):
+    db_pool.cursor_wrapper = TracingCursor
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 import functools
 import models
+import pagination
+from etags import conditional
 
 trainers_bp = Blueprint("trainers", __name__, url_prefix="/trainers")
 
@@ -18,9 +20,11 @@ def roles_required(*roles):
 @trainers_bp.route("/")
 @login_required
 @roles_required("admin","manager")
+@conditional("Trainer")
 def list_trainers():
-    ts = models.get_all_trainers()
-    return render_template("trainers.html", trainers=ts)
+    page = pagination.page_request(request.args, models.TRAINER_KEYSET)
+    ts = models.get_all_trainers(page=page)
+    return render_template("trainers.html", trainers=ts, page=ts)
 
 @trainers_bp.route("/add", methods=["GET","POST"])
 @login_required
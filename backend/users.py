@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from members import roles_required
 import models
+import pagination
 
 users_bp = Blueprint("users", __name__, url_prefix="/users")
 
@@ -9,8 +10,9 @@ users_bp = Blueprint("users", __name__, url_prefix="/users")
 @login_required
 @roles_required("admin")
 def list_users():
-    us = models.get_all_users()
-    return render_template("users.html", users=us)
+    page = pagination.page_request(request.args, models.USER_KEYSET)
+    us = models.get_all_users(page=page)
+    return render_template("users.html", users=us, page=us, roles=["admin","manager","trainer","member"])
 
 @users_bp.route("/add", methods=["GET","POST"])
 @login_required
@@ -0,0 +1,337 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import mysql.connector
+
+import models
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1.0"))
+SPOOL_DIR = os.getenv("WRITE_BEHIND_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool"))
+# fsync every event for crash safety beyond a process exit; costs a disk flush each
+FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "0").lower() in ("1", "true", "yes")
+RETRY_DELAY = 5.0
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindQueue:
+    """Buffers check-in events in memory, spooled to disk, and writes them in batches.
+
+    Every event is appended to a spool segment before it is acknowledged.
+    A flush swaps out the buffer together with the segments that hold it and
+    deletes those segments only after the database commit, so a crash at
+    any point leaves the events on disk for the next start to replay.
+    Attendance marks for the same member and session are coalesced, last
+    status wins; check-ins are kept individually.
+    """
+
+    def __init__(self, app, spool_dir=SPOOL_DIR, batch_size=BATCH_SIZE, interval=INTERVAL):
+        self.app = app
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self._cond = threading.Condition()
+        self._checkins = []
+        self._attendance = {}
+        self._files = []
+        self._spool = None
+        self._seq = 0
+        self._stopping = False
+        self._thread = None
+
+        self._queued = 0
+        self._coalesced = 0
+        self._written = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._flushes = 0
+        self._failures = 0
+        self._last_flush_ms = 0.0
+
+    # ── Spool ──
+    def _segment_path(self, suffix):
+        return os.path.join(self.spool_dir, f"{os.getpid()}-{suffix}.spool")
+
+    def _open_segment(self):
+        self._seq += 1
+        path = self._segment_path(self._seq)
+        while os.path.exists(path):
+            # Left by an earlier process that had the same PID
+            self._seq += 1
+            path = self._segment_path(self._seq)
+        self._spool = open(path, "a", encoding="utf-8")
+        self._files.append(path)
+
+    def _claim_orphans(self):
+        """Take over segments left by processes that are no longer running"""
+        claimed = []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "*.spool"))):
+            owner = os.path.basename(path).split("-", 1)[0]
+            mine = owner == str(os.getpid())
+            if owner.isdigit() and not mine and pid_alive(int(owner)):
+                continue
+            if mine and "-replay" in os.path.basename(path):
+                # Claimed by an earlier process with our PID; no live process can race us for it
+                claimed.append(path)
+                continue
+            # A fresh name never overwrites another segment, and the rename is
+            # atomic, so two workers starting together can't both replay a file
+            target = self._segment_path(f"replay-{uuid.uuid4().hex}")
+            try:
+                os.rename(path, target)
+            except OSError:
+                continue
+            claimed.append(target)
+
+        for path in claimed:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # A torn final line from the crash; everything before it is intact
+                        continue
+                    self._add(event)
+            self._files.append(path)
+        if claimed:
+            logger.info(f"Write-behind: replaying {len(self._checkins)} check-ins from {len(claimed)} spool file(s)")
+
+    # ── Buffer ──
+    def _add(self, event):
+        kind = event[0]
+        if kind == "checkin":
+            _, member_id, room_id, schedule_id, at = event
+            self._checkins.append((member_id, room_id, schedule_id, at))
+        elif kind == "attendance":
+            _, member_id, schedule_id, status = event
+            key = (member_id, schedule_id)
+            if key in self._attendance:
+                self._coalesced += 1
+            self._attendance[key] = status
+
+    def _size(self):
+        return len(self._checkins) + len(self._attendance)
+
+    def submit(self, *events):
+        with self._cond:
+            for event in events:
+                self._spool.write(json.dumps(event) + "\n")
+                self._add(event)
+                self._queued += 1
+            self._spool.flush()
+            if FSYNC:
+                os.fsync(self._spool.fileno())
+            if self._size() >= self.batch_size:
+                self._cond.notify()
+
+    def _take(self):
+        """Swap out the buffer and the spool segments that hold it (lock held)"""
+        checkins, attendance, files = self._checkins, self._attendance, self._files
+        self._checkins, self._attendance, self._files = [], {}, []
+        self._spool.close()
+        self._open_segment()
+        return checkins, attendance, files
+
+    def _restore(self, checkins, attendance, files, partial):
+        """Put a failed batch back in front of anything queued since (lock held).
+
+        After a partial write the old segments also hold committed events,
+        so what is left is spooled again and those segments are dropped.
+        """
+        self._checkins = checkins + self._checkins
+        pending = dict(attendance)
+        pending.update(self._attendance)
+        self._attendance = pending
+        if not partial:
+            self._files = files + self._files
+            return
+        for member_id, room_id, schedule_id, at in checkins:
+            self._spool.write(json.dumps(("checkin", member_id, room_id, schedule_id, at)) + "\n")
+        for (member_id, schedule_id), status in attendance.items():
+            self._spool.write(json.dumps(("attendance", member_id, schedule_id, status)) + "\n")
+        self._spool.flush()
+        os.fsync(self._spool.fileno())
+        for path in files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ── Flushing ──
+    def _write(self, checkins, attendance):
+        """Write a batch, removing events from `checkins` and `attendance` as they
+        are committed or dropped; whatever is left on error was not written"""
+        rows = [(m, s, status) for (m, s), status in attendance.items()]
+        with self.app.app_context():
+            try:
+                rejected = models.write_checkins(checkins, rows, batch_size=self.batch_size)
+                self._reject(rejected)
+                self._written += len(checkins) + len(rows) - len(rejected)
+                checkins.clear()
+                attendance.clear()
+            except mysql.connector.IntegrityError:
+                # One bad row (e.g. a member deleted meanwhile) must not
+                # block the rest forever, so retry them one at a time
+                done = 0
+                try:
+                    for checkin in checkins:
+                        self._write_one([checkin], [])
+                        done += 1
+                finally:
+                    del checkins[:done]
+                for member_id, schedule_id, status in rows:
+                    self._write_one([], [(member_id, schedule_id, status)])
+                    del attendance[(member_id, schedule_id)]
+
+    def _write_one(self, checkins, rows):
+        try:
+            rejected = models.write_checkins(checkins, rows)
+            self._reject(rejected)
+            self._written += 1 - len(rejected)
+        except mysql.connector.IntegrityError as e:
+            self._dropped += 1
+            logger.warning(f"Write-behind: dropping {checkins or rows}: {e}")
+
+    def _reject(self, events):
+        """Events admitted from a stale index entry; not recorded, but flagged for staff"""
+        if events:
+            self._rejected += len(events)
+            logger.warning(
+                "Write-behind: membership no longer active, check-ins not recorded for member(s) "
+                + ", ".join(str(m) for m in sorted({e[0] for e in events}))
+            )
+
+    def flush(self):
+        """Write everything buffered so far; returns False if the database write failed"""
+        with self._cond:
+            if not self._size() and len(self._files) <= 1:
+                return True
+            checkins, attendance, files = self._take()
+
+        started = time.perf_counter()
+        total = len(checkins) + len(attendance)
+        try:
+            if checkins or attendance:
+                self._write(checkins, attendance)
+        except Exception as e:
+            with self._cond:
+                self._restore(checkins, attendance, files, len(checkins) + len(attendance) < total)
+                self._failures += 1
+            logger.error(f"Write-behind flush failed, will retry: {e}")
+            return False
+
+        for path in files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._cond:
+            self._flushes += 1
+            self._last_flush_ms = round(1000 * (time.perf_counter() - started), 2)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or self._size() >= self.batch_size,
+                    timeout=self.interval
+                )
+                stopping = self._stopping
+            if not self.flush() and not stopping:
+                time.sleep(RETRY_DELAY)
+            if stopping:
+                return
+
+    def start(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        with self._cond:
+            self._claim_orphans()
+            self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        """Flush what is left and stop the background thread"""
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.flush():
+            with self._cond:
+                self._spool.close()
+                for path in self._files:
+                    if os.path.getsize(path) == 0:
+                        os.remove(path)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": self._size(),
+                "spool_files": len(self._files),
+                "queued": self._queued,
+                "coalesced": self._coalesced,
+                "written": self._written,
+                "dropped": self._dropped,
+                "rejected": self._rejected,
+                "flushes": self._flushes,
+                "failures": self._failures,
+                "last_flush_ms": self._last_flush_ms
+            }
+
+
+queue = None
+
+
+def init_app(app):
+    global queue
+    if not ENABLED or queue is not None:
+        return
+    queue = WriteBehindQueue(app)
+    queue.start()
+    atexit.register(queue.stop)
+
+
+def record_checkin(member_id, room_id=None, schedule_id=None):
+    """Record a check-in now, or hand it to the write-behind queue when enabled.
+
+    Queued check-ins are admitted on the caller's validation and re-checked
+    when flushed, where a lapsed membership drops and flags them; the direct
+    path re-checks membership in the database and may return False.
+    """
+    if queue is None:
+        return models.record_checkin(member_id, room_id, schedule_id)
+
+    at = datetime.now().isoformat(sep=" ", timespec="seconds")
+    events = [("checkin", member_id, room_id, schedule_id, at)]
+    if schedule_id is not None:
+        events.append(("attendance", member_id, schedule_id, "present"))
+    queue.submit(*events)
+    return True
+
+
+def stats():
+    return queue.stats() if queue is not None else {"enabled": False}
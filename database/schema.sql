@@ -131,7 +131,7 @@ CREATE TABLE IF NOT EXISTS EquipmentMaintenance (
 CREATE TABLE IF NOT EXISTS `User` (
   UserID       INT             AUTO_INCREMENT PRIMARY KEY,
   Username     VARCHAR(50)     NOT NULL UNIQUE,
-  PasswordHash VARCHAR(128)    NOT NULL,
+  PasswordHash VARCHAR(255)    NOT NULL,
   Role         ENUM('admin','manager','trainer','member') NOT NULL
 );
 